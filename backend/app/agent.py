@@ -6,233 +6,656 @@ import traceback
 import json
 import re
 import time
-import shlex
+import functools
+import contextlib
+import hashlib
+import logging
+import threading
+from typing import List, Optional, Union
+from dataclasses import dataclass, replace
 from fastapi import WebSocket # Import WebSocket for type hinting
 
 # Attempt import json_repair
 try: from json_repair import repair_json
 except ImportError: print("Warning: 'json-repair' not found."); repair_json = lambda s: s
 
-from .prompt_template import SYSTEM_PROMPT
-from .llm_handler import simple_prompt # Using the simplified LLM handler interface
-# Import tool functions
-from .tools.shell_terminal import execute_shell_command as execute_shell_command_impl
-from .tools.code_interpreter import execute_python_code as execute_python_code_impl
-from .tools.browseruse_integration import browse_website as browse_website_impl
+# orjson-backed (stdlib fallback) JSON helpers shared with main.py and the tools
+from .jsonutil import dumps as _dumps, dumpb as _dumpb, loads as _loads, dumps_pretty as _dumps_pretty, dumps_sorted as _dumps_sorted
+
+# Attempt import hyperscan (SIMD multi-pattern matcher); error keyword checks fall back to one compiled regex
+try: import hyperscan
+except ImportError: hyperscan = None
+
+# Attempt import msgspec (typed JSON decoding in C); plans are otherwise parsed leniently and checked in Python
+try: import msgspec
+except ImportError: msgspec = None
+
+from .prompt_template import SYSTEM_PROMPT, CORRECTION_PROMPT_PREFIX, FINAL_ANSWER_PROMPT_PREFIX
+from .llm_handler import simple_prompt, simple_prompt_stream # Using the simplified LLM handler interface
+from . import plan_cache
+from .task_types import Task, TaskStatus
+
+log = logging.getLogger(__name__)
+
+# --- Lazy Tool Imports ---
+# Tool modules load on first use, so a shell-only session never imports the browser integration.
+@functools.lru_cache(maxsize=None)
+def _get_shell():
+    from .tools.shell_terminal import execute_shell_command
+    return execute_shell_command
+
+@functools.lru_cache(maxsize=None)
+def _get_py():
+    from .tools.code_interpreter import execute_python_code
+    return execute_python_code
+
+@functools.lru_cache(maxsize=None)
+def _get_browser():
+    from .tools.browseruse_integration import browse_website
+    return browse_website
+
+# --- Tool Handlers ---
+# Each handler takes the step's tool params and an ExecContext and returns the tool's combined output string.
+@dataclass(slots=True)
+class ExecContext:
+    """Per-step state the tool handlers need."""
+    websocket: "Union[WebSocket, MessageBatcher]" # The workflow's batcher: tool messages share its flush window
+    previous_output: str # Output of the step this one builds on (`previous_step_result`)
+    browser_model: str
+    code_model: str # Session's code model selection, for code tools that call a model
+
+async def _run_shell(params: dict, ctx: ExecContext) -> str:
+    cmd = params.get("command", [])
+    if isinstance(cmd, list) and len(cmd) == 1: cmd = str(cmd[0]) # ["ls -la"] style: let the tool split it
+    return await _get_shell()(cmd, ctx.websocket) # Lists go through as argv untouched
+
+async def _run_code(params: dict, ctx: ExecContext) -> str:
+    code = params.get("code", "")
+    if not code: raise ValueError("Missing 'code'")
+    code_prefix = "previous_step_result = " + _dumps(_clip(ctx.previous_output, CODE_INJECT_CLIP_CHARS, CODE_INJECT_CLIP_CHARS)) + "\n\n" # A JSON string literal is a valid Python str literal
+    log.debug("[Inject] Previous result len %d.", len(ctx.previous_output))
+    return await _get_py()(code_prefix + code, ctx.websocket)
+
+async def _run_browser(params: dict, ctx: ExecContext) -> str:
+    inp = params.get("input") or params.get("browser_input", "")
+    if not inp: raise ValueError("Missing 'input'")
+    return await _get_browser()(inp, ctx.websocket, browser_model=ctx.browser_model, context_hint=ctx.previous_output, step_limit_suggestion=BROWSER_STEP_LIMIT_SUGGESTION)
+
+TOOLS = {"shell_terminal": _run_shell, "code_interpreter": _run_code, "browser": _run_browser}
 
 # --- Configuration ---
 MAX_RETRIES = 2
 MAX_WORKFLOW_STEPS = 10
+MAX_WORKFLOW_CORRECTIONS = MAX_RETRIES * 2 # Self-correction LLM calls allowed across a whole run
+CORRECTION_CACHE_SIZE = 128 # Remembered (task, failure) -> correction pairs
 BROWSER_STEP_LIMIT_SUGGESTION = 15
+BROWSER_AGENT_INTERNAL_MODEL = os.getenv("BROWSER_AGENT_INTERNAL_MODEL", "qwen2.5:7b") # Default browser model; read once at import
+DEEPCODER_MODEL = os.getenv("DEEPCODER_MODEL", "deepcoder:latest") # Default code model
+MAX_CONCURRENT_TOOLS = int(os.getenv("AGENT_MAX_CONCURRENT_TOOLS", "3")) # Tool calls running at once within one workflow
+SERIAL_TOOLS = ('shell_terminal', 'browser') # Share state (cwd/files, the display): one call of each at a time
+PLAN_STREAMING = os.getenv("AGENT_STREAM_PLAN", "1").strip().lower() not in ("0", "false", "no") # Start steps while the plan is still generating
+TASK_UPDATE_COALESCE_DELAY = 0.05 # Seconds to let task-list changes pile up before one UI frame
+MESSAGE_FLUSH_DELAY = 0.005 # Seconds a queued chat message may wait for others to share its frame
+OUTPUT_CLIP_CHARS = 4096 # Head and tail kept from tool output sent to the LLM / UI
+CORRECTION_CLIP_CHARS = 2048 # Head and tail of the failed output in a correction prompt (error line + command echo)
+CODE_INJECT_CLIP_CHARS = 32768 # Head and tail kept from previous_step_result injected into code
+
+# --- Precompiled Patterns ---
+_EXIT_RE = re.compile(r'^Exit Code:\s*(-?\d+)', re.M)
+_OUT_MKR = re.compile(r'^(Output|Stdout Log):', re.I)
+_ERR_MKR = re.compile(r'^(Error|Errors|Stderr Log):', re.I)
+_FENCE_RE = re.compile(r'^```json\s*|\s*```$', re.M | re.S)
+STEP_FAIL_KEYWORDS = ("error:", "fail", "except", "timeout") # Per-step success check
+REVIEW_ERROR_KEYWORDS = STEP_FAIL_KEYWORDS + ("trace", "denied", "not found", "invalid json") # Failure review; "exit code:" deliberately absent (every tool output has it)
+
+def _keyword_matcher(keywords):
+    """Returns has_keyword(text) -> bool: one case-insensitive pass for all keywords (hyperscan DFA if installed, else an alternation regex)."""
+    if hyperscan is not None:
+        db = hyperscan.Database()
+        db.compile(expressions=[re.escape(k).encode() for k in keywords], ids=list(range(len(keywords))), elements=len(keywords), flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(keywords))
+        halted = (hyperscan.HS_SCAN_TERMINATED, f"error code {hyperscan.HS_SCAN_TERMINATED}") # How hyperscan.error (or its ScanTerminated subclass) carries the code
+        def has_keyword(text: str) -> bool:
+            found = []
+            def on_match(_id, _start, _end, _flags, _ctx): found.append(_id); return True # First hit is enough: stop scanning
+            try: db.scan(text.encode("utf-8", "surrogatepass"), match_event_handler=on_match) # Single shared scratch: call from the event loop thread only
+            except hyperscan.error as e:
+                if not any(a in halted for a in e.args): raise # Only the stop requested by on_match is expected
+            return bool(found)
+        return has_keyword
+    pattern = re.compile("|".join(map(re.escape, keywords)), re.I) # No lower() copy
+    return lambda text: pattern.search(text) is not None
+
+has_step_fail_keyword = _keyword_matcher(STEP_FAIL_KEYWORDS)
+has_error_keyword = _keyword_matcher(REVIEW_ERROR_KEYWORDS)
+
+# --- Helper: Clip Long Text ---
+def _clip(s: str, head: int = OUTPUT_CLIP_CHARS, tail: int = OUTPUT_CLIP_CHARS) -> str:
+    """Keep the head and tail of long text with an elision marker, bounding prompt tokens and WS bytes."""
+    if s is None or len(s) <= head + tail + 64: return s
+    return f"{s[:head]}\n...[{len(s) - head - tail} chars elided]...\n{s[-tail:]}"
+
+# --- Helper: Strip Markdown Fences ---
+def _strip_fences(s: str) -> str:
+    """Remove a ```json ... ``` wrapper. Plain prefix/suffix checks for the usual wrapped-or-not case;
+    the multiline regex runs only if a fence is left somewhere inside."""
+    t = s.strip()
+    if t.startswith("```"): t = t[7:] if t.startswith("```json") else t[3:]
+    if t.endswith("```"): t = t[:-3]
+    return _FENCE_RE.sub('', t).strip() if "```" in t else t.strip()
 
 # --- Helper: Send Task List Update ---
-async def send_task_update(websocket: WebSocket, tasks_with_status: list):
-    """Formats tasks and sends via WebSocket using TASK_LIST_UPDATE prefix."""
+async def send_task_update(websocket: WebSocket, tasks: list):
+    """Sends the task list as UI-shaped {description, status} dicts via WebSocket using TASK_LIST_UPDATE prefix."""
     try:
-        tasks_for_ui = [{"description": t.get("description", "Task"), "status": t.get("status", "pending")} for t in tasks_with_status]
-        payload = json.dumps(tasks_for_ui)
-        await websocket.send_text(f"TASK_LIST_UPDATE:{payload}")
-    except Exception as e: print(f"Error sending task update: {e}")
+        await websocket.send_text("TASK_LIST_UPDATE:" + _dumps([{'description': t.description or 'Task', 'status': t.status} for t in tasks]))
+    except Exception as e: log.warning("Error sending task update: %s", e)
+
+# --- Helper: Batch WebSocket Messages ---
+class MessageBatcher:
+    """Queues outgoing chat messages and writes everything queued as one WebSocket frame per flush().
+    Several messages go out as one binary MESSAGE_BATCH:<json list of strings> frame (UTF-8, never decoded to str);
+    a lone message is sent unchanged as text.
+    Queued messages are flushed at the latest `delay` seconds later, so tools can write through the batcher too;
+    errors go out at once. Flush before anything slow (tool run, LLM call) so the UI never waits on a queued message."""
+    MAX_PENDING = 128 # Flush early once this many messages are queued
+
+    def __init__(self, websocket: WebSocket, delay: float = MESSAGE_FLUSH_DELAY):
+        self.websocket, self.delay, self._pending = websocket, delay, []
+        self._lock = asyncio.Lock(); self._timer = None # Lock keeps frames in queue order across concurrent flushes
+
+    async def send_text(self, message: str):
+        self._pending.append(message)
+        if len(self._pending) >= self.MAX_PENDING or message.startswith("Agent Error"): await self.flush() # Never hold back an error
+        elif self._timer is None: self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay); self._timer = None
+        try: await self.flush()
+        except Exception as e: log.warning("Error sending queued messages: %s", e)
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending: return
+            pending, self._pending = self._pending, [] # Swap first: concurrent steps may queue while we send
+            if len(pending) == 1: await self.websocket.send_text(pending[0])
+            else: await self.websocket.send_bytes(b"MESSAGE_BATCH:" + _dumpb(pending))
+
+    def close(self):
+        """Stop the pending timed flush (call after the final flush())."""
+        if self._timer is not None: self._timer.cancel(); self._timer = None
+
+# --- Helper: Coalesce Task List Updates ---
+class TaskUpdateCoalescer:
+    """Folds bursts of task-list changes into a single TASK_LIST_UPDATE frame.
+    Holds only a reference to the task list; it is serialized once per flush, so
+    rapid running->done->running transitions cost one frame instead of several."""
+    def __init__(self, websocket: WebSocket, delay: float = TASK_UPDATE_COALESCE_DELAY):
+        self.websocket, self.delay = websocket, delay
+        self._tasks, self._dirty, self._closed = None, False, False
+        self._event = asyncio.Event(); self._runner = None
+
+    def mark_dirty(self, tasks: list):
+        """Record the latest task list (of TaskStatus) and wake the background flusher."""
+        self._tasks, self._dirty = tasks, True; self._event.set()
+        if self._runner is None and not self._closed: self._runner = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closed:
+            await self._event.wait()
+            if not self._closed: await asyncio.sleep(self.delay) # Drain window: later updates replace the snapshot
+            self._event.clear()
+            if self._dirty: await self._send()
+
+    async def _send(self):
+        self._dirty = False; await send_task_update(self.websocket, self._tasks)
+        if isinstance(self.websocket, MessageBatcher): # Queued behind earlier messages, but never held back
+            try: await self.websocket.flush()
+            except Exception as e: log.warning("Error sending task update: %s", e)
+
+    async def close(self):
+        """Flush any pending snapshot and stop the flusher."""
+        self._closed = True; self._event.set()
+        if self._runner is not None: await self._runner; self._runner = None
+        elif self._dirty: await self._send()
 
 # --- Helper: Parse Tool Output ---
 def parse_tool_output(output_str: str) -> dict:
-    """Parses the combined string output from tools into structured data."""
-    result = {'raw': output_str, 'exit_code': None, 'output': '', 'error': ''}
+    """Parses the combined string output from tools into structured data.
+    'error_kw' records whether the output carries a step-failure keyword, so callers need no second scan."""
+    result = {'raw': output_str, 'exit_code': None, 'output': '', 'error': '', 'error_kw': False}
     if not isinstance(output_str, str): result['error'] = f"Invalid tool output type: {type(output_str)}"; return result
-    exit_match = re.search(r'^Exit Code:\s*(-?\d+)', output_str, re.M); result['exit_code'] = int(exit_match.group(1)) if exit_match else None
+    exit_match = _EXIT_RE.search(output_str); result['exit_code'] = int(exit_match.group(1)) if exit_match else None
     out_lines, err_lines, section = [], [], None
-    out_mkr, err_mkr = re.compile(r'^(Output|Stdout Log):', re.I), re.compile(r'^(Error|Errors|Stderr Log):', re.I)
-    for line in output_str.splitlines():
-        if out_mkr.match(line): section = 'out'; continue
-        elif err_mkr.match(line): section = 'err'; continue
+    for line in output_str.split('\n'):
+        if _OUT_MKR.match(line): section = 'out'; continue
+        elif _ERR_MKR.match(line): section = 'err'; continue
         elif line.startswith("Exit Code:"): section = None; continue
         if section == 'out': out_lines.append(line)
         elif section == 'err': err_lines.append(line)
-    result['output'] = "\n".join(out_lines).strip(); result['error'] = "\n".join(err_lines).strip()
+    result['output'] = "\n".join(out_lines).strip(); result['error'] = "\n".join(err_lines).strip(); result['error_kw'] = has_step_fail_keyword(output_str) # Single scan of the whole string
     if not result['output'] and not result['error']:
         clean = output_str.replace(exit_match.group(0), '', 1).strip() if exit_match else output_str
         if result['exit_code'] is not None and result['exit_code'] != 0: result['error'] = clean
         else: result['output'] = clean
     return result
 
+# --- Helper: Step Dependencies ---
+def _reads_previous_result(task: Task) -> bool:
+    """True if the step consumes the previous step's output via `previous_step_result`."""
+    return any(isinstance(task.params.get(k), str) and "previous_step_result" in task.params[k] for k in ('code', 'input', 'browser_input'))
+
+def _step_dependencies(task: Task, idx: int) -> list:
+    """0-based indices of the earlier steps step `idx` waits for: the plan's `depends_on` (1-based step numbers)
+    if given, else the previous step when the task reads `previous_step_result`, else none."""
+    if task.depends_on is None: return [idx - 1] if idx and _reads_previous_result(task) else []
+    deps = set()
+    for d in task.depends_on if isinstance(task.depends_on, (list, tuple)) else [task.depends_on]: # Tolerate a bare number
+        try: d = int(d)
+        except (TypeError, ValueError): d = 0
+        if 1 <= d <= idx: deps.add(d - 1)
+        else: log.warning("Step %d depends_on %r is not an earlier step; ignored.", idx+1, d)
+    return sorted(deps)
+
+# --- Helper: Streamed Planning ---
+async def _stream_in_thread(gen_fn, *args, **kwargs):
+    """Iterate a blocking generator (e.g. a streaming LLM call) in a worker thread, yielding items on the event loop.
+    Leaving the `async for` early tells the worker to stop at the next item."""
+    loop, queue, stop, done = asyncio.get_running_loop(), asyncio.Queue(), threading.Event(), object()
+    def put(item):
+        try: loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError: stop.set() # Event loop already gone
+    def pump():
+        try:
+            for item in gen_fn(*args, **kwargs):
+                if stop.is_set(): break
+                put(item)
+        except Exception as e: put(e)
+        finally: put(done)
+    loop.run_in_executor(None, pump)
+    try:
+        while (item := await queue.get()) is not done:
+            if isinstance(item, Exception): raise item
+            yield item
+    finally: stop.set()
+
+class PlanStreamScanner:
+    """Cuts complete top-level task objects out of a streamed planner response as soon as each one closes.
+    Waits for a closing </thinking_process> tag directly followed by the plan list (optionally ```json-fenced);
+    a tag quoted mid-thought is skipped. extract_plan_json takes the *last* tag, so once the stream ends the caller
+    checks `tag_end` against it. String literals are tracked so braces inside `code`/`command` values do not
+    upset the depth count."""
+    TAG = "</thinking_process>"
+    def __init__(self):
+        self.text, self.pos, self.state, self.tag_end = "", 0, 'tag', -1
+        self.depth, self.in_str, self.escaped, self.obj_start = 0, False, False, -1
+
+    def feed(self, chunk: str) -> list:
+        """Add streamed text; returns the JSON text of every task object completed by it."""
+        self.text += chunk; found = []
+        while self.state in ('tag', 'list'):
+            if self.state == 'tag':
+                i = self.text.find(self.TAG, self.pos)
+                if i == -1: self.pos = max(self.pos, len(self.text) - len(self.TAG) + 1); return found # A tag may be split across chunks
+                self.pos = self.tag_end = i + len(self.TAG); self.state = 'list'
+            rest = self.text[self.pos:].lstrip()
+            if rest.startswith("```"): # Fence line: skip it once it is complete
+                nl = rest.find("\n")
+                if nl == -1: return found
+                self.pos = len(self.text) - len(rest) + nl + 1; continue
+            if not rest or "```".startswith(rest): return found # Only whitespace / a partial fence so far
+            if rest[0] != '[': self.state = 'tag'; continue # Quoted tag: look for a later one
+            self.pos, self.state = len(self.text) - len(rest) + 1, 'items'
+        if self.state == 'items':
+            text, depth, in_str, escaped, start = self.text, self.depth, self.in_str, self.escaped, self.obj_start
+            for j in range(self.pos, len(text)):
+                c = text[j]
+                if in_str:
+                    if escaped: escaped = False
+                    elif c == '\\': escaped = True
+                    elif c == '"': in_str = False
+                elif c == '"': in_str = True
+                elif c == '{':
+                    if depth == 0: start = j
+                    depth += 1
+                elif c == '}' and depth:
+                    depth -= 1
+                    if depth == 0: found.append(text[start:j + 1])
+                elif c == ']' and depth == 0: self.state = 'done'; break
+            self.pos, self.depth, self.in_str, self.escaped, self.obj_start = len(text), depth, in_str, escaped, start
+        return found
+
+# --- Step 0a: Extract Plan JSON ---
+def extract_plan_json(raw_llm_response: str) -> str:
+    """Return the candidate JSON plan text from the planner response, ignoring the <thinking_process> block."""
+    extracted_plan_json_str = None
+    closing_tag = "</thinking_process>" # Tag defined in prompt
+    # Use rfind to find the *last* occurrence of the tag
+    tag_index = raw_llm_response.rfind(closing_tag)
+
+    if tag_index != -1:
+        # Extract text *after* the closing tag
+        potential_json = raw_llm_response[tag_index + len(closing_tag):].strip()
+        log.debug("Text found after '%s':\n%s...", closing_tag, potential_json[:300])
+        # Basic check for JSON list format before trying to parse
+        if potential_json.startswith('[') and potential_json.endswith(']'):
+            extracted_plan_json_str = potential_json
+            log.debug("Extracted potential JSON plan after closing tag.")
+        else:
+            log.warning("Text after '%s' does not look like JSON list. Trying fallback.", closing_tag)
+            # Fallback: slice from the first '[' to the last ']' after the tag (linear; handles ```json fences / trailing prose)
+            list_start, list_end = potential_json.find('['), potential_json.rfind(']')
+            if list_start != -1 and list_end > list_start:
+                extracted_plan_json_str = potential_json[list_start:list_end + 1]
+                log.debug("Found JSON list via fallback bracket scan.")
+            else:
+                extracted_plan_json_str = raw_llm_response # Pass raw below
+    else:
+        # Closing tag not found, maybe LLM didn't output thoughts? Try parsing whole response
+        log.warning("Closing tag '%s' not found. Attempting to parse entire response as JSON.", closing_tag)
+        extracted_plan_json_str = _strip_fences(raw_llm_response)
+
+    if extracted_plan_json_str is None: # Should only happen if all extraction fails
+         raise ValueError(f"Failed to extract any candidate JSON plan string.\nResponse:\n{raw_llm_response[:500]}...")
+    return extracted_plan_json_str
+
 # --- Step 0: Parse Plan ---
+_RAW_DECODER = json.JSONDecoder()
+
+def _loads_lenient(text: str):
+    """Parse JSON. If that fails, decode the first JSON value in the text (ignores surrounding fences / trailing prose);
+    repair_json runs only when the value itself is broken."""
+    try: return _loads(text) # Fast path: already valid JSON
+    except ValueError: pass
+    start = min((i for i in (text.find('['), text.find('{')) if i != -1), default=-1)
+    if start != -1:
+        try: return _RAW_DECODER.raw_decode(text, start)[0] # One parse, stops at the end of the value
+        except ValueError: pass
+    return _loads(repair_json(text))
+
+def _validate_task(task, i: int) -> Task:
+    """Check one plan item, fill in fields the LLM may have left out and return it as a Task. Raises ValueError."""
+    if not isinstance(task, dict): raise ValueError(f"Item {i} not dict: {task}")
+    if 'tool' not in task: raise ValueError(f"Task {i} missing 'tool': {task}")
+    # Add defaults for new fields if LLM forgets them (makes parsing robust)
+    task.setdefault('expected_output', "No specific expectation defined."); task.setdefault('reasoning', "No reasoning provided.")
+    if not task.get('description'):
+        tool, p = task.get('tool','?'), task.get('command') or task.get('code') or task.get('input','')
+        if p: p = p[:50] if isinstance(p, str) else str(p)[:50] # Slice strings before any copy
+        task['description'] = f"Run {tool}" + (f" ({p}...)" if p else f" step {i+1}")
+    return Task.from_dict(task)
+
+if msgspec is not None:
+    class _PlanItem(msgspec.Struct, forbid_unknown_fields=True):
+        """Plan step schema for the native decoder; missing metadata is filled in by _validate_task.
+        Unknown keys fail decoding, so the lenient path keeps them in Task.params just as it does without msgspec."""
+        tool: str
+        description: Optional[str] = None
+        reasoning: Optional[str] = None
+        expected_output: Optional[str] = None
+        command: Union[List[str], str, None] = None
+        code: Optional[str] = None
+        input: Optional[str] = None
+        browser_input: Optional[str] = None
+        depends_on: Optional[List[int]] = None
+    _plan_decoder = msgspec.json.Decoder(Union[List[_PlanItem], _PlanItem])
+
+def _decode_plan_fast(text: str) -> Optional[list]:
+    """Decode and type-check a plan (list or single step) in one native pass.
+    None if msgspec is missing or the text does not fit the schema; callers then take the lenient path."""
+    if msgspec is None: return None
+    try: items = _plan_decoder.decode(text)
+    except msgspec.DecodeError: return None # Also covers ValidationError
+    tasks = []
+    for i, item in enumerate(items if isinstance(items, list) else [items]):
+        fields = {f: getattr(item, f) for f in item.__struct_fields__}
+        tasks.append(_validate_task({k: v for k, v in fields.items() if v is not None}, i))
+    return tasks
+
 # *** Simplified: Assumes input string is *only* the JSON part ***
 # (Extraction happens before calling this function now)
-def parse_plan(plan_json_str: str):
-    """Parse and validate the extracted JSON plan string."""
-    original = plan_json_str
+def parse_plan(plan_json_str: str) -> list:
+    """Parse and validate the extracted JSON plan string into a list of Task."""
+    original = plan_json_str or ""
     try:
         if not plan_json_str: raise ValueError("Received empty plan string.")
-        parsed_plan = json.loads(repair_json(plan_json_str)) # Try repair/parse
+        fast = _decode_plan_fast(plan_json_str)
+        if fast is not None: return fast # Well-formed plan: already validated
+        parsed_plan = _loads_lenient(plan_json_str)
 
         if not isinstance(parsed_plan, list):
             if isinstance(parsed_plan, dict) and 'tool' in parsed_plan: parsed_plan = [parsed_plan]
             else: raise ValueError(f"Plan must be a list, got {type(parsed_plan)}.")
-        valid = []
-        for i, task in enumerate(parsed_plan):
-            if not isinstance(task, dict): raise ValueError(f"Item {i} not dict: {task}")
-            if 'tool' not in task: raise ValueError(f"Task {i} missing 'tool': {task}")
-            if not task.get('description'):
-                tool, p = task.get('tool','?'), task.get('command') or task.get('code') or task.get('input','')
-                task['description'] = f"Run {tool}" + (f" ({str(p)[:50]}...)" if p else f" step {i+1}")
-            # Add defaults for new fields if LLM forgets them (makes parsing robust)
-            if 'expected_output' not in task: task['expected_output'] = "No specific expectation defined."
-            if 'reasoning' not in task: task['reasoning'] = "No reasoning provided."
-            valid.append(task)
-        return valid
-    except json.JSONDecodeError as e: raise ValueError(f"Invalid JSON received in plan string: {e}\nInput:\n{original}") from e
-    except ValueError as e: raise ValueError(f"Invalid plan structure: {e}\nInput:\n{original}") from e
-    except Exception as e: raise ValueError(f"Unexpected plan parsing error: {e}\nInput:\n{original}") from e
+        return [_validate_task(task, i) for i, task in enumerate(parsed_plan)]
+    except json.JSONDecodeError as e: raise ValueError(f"Invalid JSON received in plan string: {e}\nInput:\n{original[:500]!r}") from e
+    except ValueError as e: raise ValueError(f"Invalid plan structure: {e}\nInput:\n{original[:500]!r}") from e
+    except Exception as e: raise ValueError(f"Unexpected plan parsing error: {e}\nInput:\n{original[:500]!r}") from e
 
 # --- Step 1b: Review & Resolve ---
-async def review_and_resolve(task: dict, result_str: str, attempt: int, planner_model_name: str, websocket: WebSocket):
-    """Attempt self-correction for a failed step using the specified planner LLM."""
-    parsed = parse_tool_output(result_str); exit_code, error_content, raw = parsed.get('exit_code'), parsed.get('error'), parsed.get('raw', '')
+_correction_cache: dict = {} # blake2b key -> corrected Task; insertion order gives FIFO eviction
+
+def _correction_key(model: str, task: Task, reason: str, parsed: dict) -> str:
+    """Hash the failing call and its failure signature; identical failures map to the same correction."""
+    call = _dumps_sorted(task.to_dict())
+    key_src = "\x1f".join((model, call, reason, (parsed.get('error') or parsed.get('raw') or '')[:1024]))
+    return hashlib.blake2b(key_src.encode('utf-8', 'replace'), digest_size=16).hexdigest()
+
+class CorrectionBudget:
+    """Caps the self-correction LLM calls of one workflow run; shared by concurrently running steps."""
+    def __init__(self, total: int = MAX_WORKFLOW_CORRECTIONS): self.total = self.remaining = total
+
+    def take(self) -> bool:
+        """Consume one correction; False once the budget is exhausted."""
+        if self.remaining <= 0: return False
+        self.remaining -= 1; return True
+
+async def review_and_resolve(task: Task, parsed: dict, attempt: int, planner_model_name: str, out: MessageBatcher, budget: CorrectionBudget = None):
+    """Attempt self-correction for a failed step (given its parse_tool_output result) using the specified planner LLM."""
+    exit_code, error_content, raw = parsed.get('exit_code'), parsed.get('error'), parsed.get('raw', '')
     is_error, reason = False, "Unknown failure"
     if exit_code is not None and exit_code != 0: is_error, reason = True, f"Non-zero exit ({exit_code})"
-    elif any(e in raw.lower() for e in ["error:", "fail", "except", "trace", "timeout", "denied", "not found"]): is_error, reason = True, "Error keyword"
+    elif has_error_keyword(raw): is_error, reason = True, "Error keyword"
     elif exit_code == 0 and not error_content and not parsed.get('output'): is_error, reason = True, "Exit 0 but no output"
 
     if is_error and attempt < MAX_RETRIES:
-        fail_json = json.dumps({k: v for k, v in task.items() if k not in ['status','expected_output','reasoning']}, indent=2)
-        expected = task.get('expected_output', 'N/A')
-        prompt = (f"Failed step {attempt+1}/{MAX_RETRIES}:\nTask: {task.get('description','N/A')}\nExpected: {expected}\nCall:\n```json\n{fail_json}\n```\nReason: {reason}\nOutput:\n```\n{raw}\n```\n\nProvide ONLY corrected JSON tool call (incl. 'tool', 'description', 'expected_output', 'reasoning', params).")
-        await websocket.send_text(f"Agent: Reviewing failure ({reason}. Try {attempt + 1})...")
-        correction = simple_prompt(model=planner_model_name, prompt=prompt, system=SYSTEM_PROMPT)
-        if not correction: await websocket.send_text("Warn: LLM gave no correction."); return None
+        cache_key = _correction_key(planner_model_name, task, reason, parsed)
+        if cache_key in _correction_cache: await out.send_text("Agent: Reusing cached correction for an identical failure."); return replace(_correction_cache[cache_key])
+        if budget is not None and not budget.take(): await out.send_text(f"Agent: Correction budget ({budget.total}) for this workflow used up; not retrying."); return None
+        fail_json = _dumps_pretty({'tool': task.tool, 'description': task.description, **task.params})
+        parts = [CORRECTION_PROMPT_PREFIX, f"Failed step {attempt+1}/{MAX_RETRIES}:", f"Task: {task.description or 'N/A'}", f"Expected: {task.expected_output}",
+                 f"Call:\n```json\n{fail_json}\n```", f"Reason: {reason}"]
+        if raw: parts.append(f"Output:\n```\n{_clip(raw, CORRECTION_CLIP_CHARS, CORRECTION_CLIP_CHARS)}\n```") # Omit the block entirely when there is nothing to show
+        prompt = "\n".join(parts)
+        await out.send_text(f"Agent: Reviewing failure ({reason}. Try {attempt + 1})...")
+        await out.flush(); correction = await asyncio.to_thread(simple_prompt, model=planner_model_name, prompt=prompt, system=SYSTEM_PROMPT) # Blocking Ollama call; keep the event loop free
+        if not correction: await out.send_text("Warn: LLM gave no correction."); return None
         try:
-            clean = re.sub(r'^```json\s*|\s*```$', '', correction, flags=re.M | re.S).strip()
+            clean = _strip_fences(correction)
             if not clean: raise ValueError("Empty correction.")
-            fixed = json.loads(repair_json(clean))
+            fixed = _loads_lenient(clean)
             if not isinstance(fixed, dict) or 'tool' not in fixed: raise ValueError("Correction invalid.")
-            if not fixed.get('description'): fixed['description'] = task.get('description', "Corrected task")
-            if 'expected_output' not in fixed: fixed['expected_output'] = task.get('expected_output', "N/A")
-            if 'reasoning' not in fixed: fixed['reasoning'] = task.get('reasoning', "N/A")
-            await websocket.send_text("Agent: Received potential correction."); return fixed
-        except Exception as e: await websocket.send_text(f"Error parsing correction: {e}\nRaw: {correction}"); return None
-    elif is_error: await websocket.send_text(f"Agent: Step failed, max retries ({MAX_RETRIES}) reached.")
+            fixed.setdefault('expected_output', task.expected_output); fixed.setdefault('reasoning', task.reasoning)
+            fixed = Task.from_dict(fixed)
+            if not fixed.description: fixed = replace(fixed, description=task.description or "Corrected task")
+            if len(_correction_cache) >= CORRECTION_CACHE_SIZE: del _correction_cache[next(iter(_correction_cache))]
+            _correction_cache[cache_key] = replace(fixed) # Callers get copies, so the cached entry stays pristine
+            await out.send_text("Agent: Received potential correction."); return fixed
+        except Exception as e: await out.send_text(f"Error parsing correction: {e}\nRaw: {correction}"); return None
+    elif is_error: await out.send_text(f"Agent: Step failed, max retries ({MAX_RETRIES}) reached.")
     return None
 
 # --- Step 1→3: Main Agent Workflow ---
-async def handle_agent_workflow(user_query: str, planner_model_name: str, websocket: WebSocket):
+async def handle_agent_workflow(user_query: str, planner_model_name: str, websocket: WebSocket, browser_model: str = None, code_model: str = None):
     """Main execution loop: Plan -> Send Tasks -> Execute Steps -> Final Validation/Summarization -> Finish."""
     tasks = []; msg = "Agent: Workflow finished."; stopped = False; failed = False; final_answer = None
+    out = MessageBatcher(websocket) # Chat messages from the workflow and its tools, in send order
+    coalescer = TaskUpdateCoalescer(out); correction_budget = CorrectionBudget()
+    steps = {} # Step index -> asyncio.Task that waits for the step's dependencies, then runs it
     try:
-        # 1) PLAN
-        await websocket.send_text("Agent: Planning steps...")
-        print(f"Using Planner: {planner_model_name}")
-        # Prompt asks for thinking block THEN json list
-        raw_llm_response = simple_prompt(model=planner_model_name, prompt=user_query, system=SYSTEM_PROMPT)
-        if not raw_llm_response: raise ValueError("LLM plan response empty.")
-
-        # *** EXTRACT JSON PLAN, IGNORING <thinking_process> BLOCK ***
-        extracted_plan_json_str = None
-        closing_tag = "</thinking_process>" # Tag defined in prompt
-        # Use rfind to find the *last* occurrence of the tag
-        tag_index = raw_llm_response.rfind(closing_tag)
-
-        if tag_index != -1:
-            # Extract text *after* the closing tag
-            potential_json = raw_llm_response[tag_index + len(closing_tag):].strip()
-            print(f"DEBUG: Text found after '{closing_tag}':\n{potential_json[:300]}...")
-            # Basic check for JSON list format before trying to parse
-            if potential_json.startswith('[') and potential_json.endswith(']'):
-                extracted_plan_json_str = potential_json
-                print("DEBUG: Extracted potential JSON plan after closing tag.")
-            else:
-                print(f"ERROR: Text after '{closing_tag}' does not look like JSON list. Trying fallback.")
-                # Fallback: Try finding last JSON block in whole string if format wrong
-                fallback_match = re.search(r"(\[.*?\])\s*$", raw_llm_response, re.DOTALL)
-                if fallback_match:
-                    extracted_plan_json_str = fallback_match.group(1).strip()
-                    print("DEBUG: Found JSON list via fallback search at the end.")
-                else:
-                    extracted_plan_json_str = raw_llm_response # Pass raw below
-        else:
-            # Closing tag not found, maybe LLM didn't output thoughts? Try parsing whole response
-            print(f"Warning: Closing tag '{closing_tag}' not found. Attempting to parse entire response as JSON.")
-            extracted_plan_json_str = re.sub(r'^```json\s*|\s*```$', '', raw_llm_response, flags=re.M | re.S).strip()
-
-        if extracted_plan_json_str is None: # Should only happen if all extraction fails
-             raise ValueError(f"Failed to extract any candidate JSON plan string.\nResponse:\n{raw_llm_response[:500]}...")
-
-        # Parse the extracted string (parse_plan now expects potential errors)
-        raw_tasks = parse_plan(extracted_plan_json_str)
-        # ******************************************************
-
-        tasks = [{'description': t.get('description'), 'status': 'pending', 'original_task': t, 'result': None, 'final_executed_task': None} for t in raw_tasks]
-
-        # 2) SEND Initial List
-        await send_task_update(websocket, tasks)
-        if not tasks: await websocket.send_text("Agent: No steps planned."); return
-        await websocket.send_text(f"Agent: Plan: {len(tasks)} steps.")
-
-        # 3) EXECUTE STEPS
-        last_successful_output = "No output from previous steps."
-        count = 0
-        for idx, task in enumerate(tasks):
-            if count >= MAX_WORKFLOW_STEPS: # Check Limit
-                await websocket.send_text(f"**Warn: Max steps ({MAX_WORKFLOW_STEPS}) reached.**")
-                stopped = True; break
-            tasks[idx]['status'] = 'running'; await send_task_update(websocket, tasks)
-            reason = task.get('original_task', {}).get('reasoning', 'N/A')
-            expected = task.get('original_task', {}).get('expected_output', 'N/A')
-            await websocket.send_text(f"**Agent: Step {idx+1}/{len(tasks)}: {task['description']}**\n - Reasoning: {reason}\n - Expecting: {expected}")
-            current, step_res_str, final_task = task['original_task'].copy(), "Error: Step skip.", task['original_task'].copy()
+        # 1) PLAN -> 3) EXECUTE, overlapped: each step is dispatched as soon as the planner emits it.
+        # Steps form a DAG (`depends_on`, or the data flow through `previous_step_result`); a step starts once all
+        # its dependencies are done, so independent steps run concurrently, bounded by MAX_CONCURRENT_TOOLS.
+        outputs = {} # Step index -> output handed to later steps; `tasks` (TaskStatus per step) doubles as the UI task list
+        failed_step, plan_complete = None, False
+        tool_slots = asyncio.Semaphore(MAX_CONCURRENT_TOOLS); tool_locks = {name: asyncio.Lock() for name in SERIAL_TOOLS}
+        async def execute_step(idx: int, last_successful_output: str) -> bool:
+            """Run one planned step with retries/corrections. Returns True if it finished in error."""
+            state = tasks[idx]; state.status = 'running'; coalescer.mark_dirty(tasks)
+            parallel, queued, tool = [], [], state.task.tool
+            for i, t in enumerate(tasks):
+                if t.status != 'running' or i == idx: continue
+                (queued if tool in SERIAL_TOOLS and (t.executed or t.task).tool == tool else parallel).append(str(i+1)) # Same serial tool: waits on its lock
+            if parallel: await out.send_text(f"Agent: Step {idx+1} runs in parallel with step(s) {', '.join(parallel)}.")
+            if queued: await out.send_text(f"Agent: Step {idx+1} is queued behind step(s) {', '.join(queued)} (one {tool} call at a time).")
+            current = state.executed = state.task # Tasks are never mutated; a correction replaces `current` wholesale
+            await out.send_text(f"**Agent: Step {idx+1}{f'/{len(tasks)}' if plan_complete else ''}: {state.description}**\n - Reasoning: {current.reasoning}\n - Expecting: {current.expected_output}")
+            step_res_str, parsed, step_failed = "Error: Step skip.", None, True # Verdict of the last attempt; a step that never got a clean run failed
 
+            tool, params = current.tool, current.params
+            ctx = ExecContext(out, last_successful_output, browser_model or BROWSER_AGENT_INTERNAL_MODEL, code_model or DEEPCODER_MODEL) # Tool messages are batched too
             # Retry Loop
             for attempt in range(MAX_RETRIES + 1):
-                tool = current.get("tool"); params = {k:v for k,v in current.items() if k not in ['description','tool','s','reasoning','expected_output']}
-                await websocket.send_text(f"Tool Input ({tool}): {json.dumps(params, indent=2, ensure_ascii=False)}")
-                print(f"Exec Step {idx+1}, Try {attempt+1}: {tool}, Task='{task['description']}'")
-                attempt_res_str = ""
+                await out.send_text(f"Tool Input ({tool}): {_clip(_dumps(params))}") # Generated code can be long
+                log.info("Exec Step %d, Try %d: %s, Task='%s'", idx+1, attempt+1, tool, current.description)
+                attempt_res_str = ""; await out.flush()
                 try: # Tool Execution
-                    if tool == "shell_terminal":
-                        cmd = current.get("command", []); cmd_str=" ".join(shlex.split(" ".join(cmd)) if isinstance(cmd,list) else shlex.split(cmd))
-                        attempt_res_str = await execute_shell_command_impl(cmd_str, websocket)
-                    elif tool == "code_interpreter":
-                        code = current.get("code", "");
-                        if not code: raise ValueError("Missing 'code'")
-                        safe_prev = last_successful_output.replace('"""', '\\"\\"\\"'); code_prefix = f'previous_step_result = """{safe_prev}"""\n\n'
-                        print(f"[Inject] Previous result len {len(last_successful_output)}.")
-                        attempt_res_str = await execute_python_code_impl(code_prefix + code, websocket)
-                    elif tool == "browser":
-                        inp = current.get("input") or current.get("browser_input", ""); browser_model = os.getenv("BROWSER_AGENT_INTERNAL_MODEL", "qwen2.5:7b")
-                        if not inp: raise ValueError("Missing 'input'")
-                        attempt_res_str = await browse_website_impl(inp, websocket, browser_model=browser_model, context_hint=last_successful_output, step_limit_suggestion=BROWSER_STEP_LIMIT_SUGGESTION)
-                    else: attempt_res_str = f"Error: Unknown tool '{tool}'."; break
+                    handler = TOOLS.get(tool)
+                    if handler is None: attempt_res_str = f"Error: Unknown tool '{tool}'."; break
+                    async with tool_slots, tool_locks.get(tool) or contextlib.nullcontext(): # Concurrency cap; serial tools one at a time
+                        attempt_res_str = await handler(params, ctx)
                     # Check Result
                     step_res_str = attempt_res_str; parsed = parse_tool_output(step_res_str); exit_code = parsed.get('exit_code');
-                    step_failed = False
-                    if exit_code is not None and exit_code != 0: step_failed = True
-                    elif any(e in step_res_str.lower() for e in ["error:", "fail", "except", "timeout"]): step_failed = True
+                    step_failed = (exit_code is not None and exit_code != 0) or parsed['error_kw']
                     # Optional: Add check here: if not step_failed and tool in ["code_interpreter", "browser"]: step_failed = not check_output_vs_expected(parsed.get('output'), current.get('expected_output'))
-                    await websocket.send_text(f"Tool Output (Try {attempt+1}):\n```\n{step_res_str}\n```"); print(f"Step {idx+1}, Try {attempt+1} Exit={exit_code}, Failed={step_failed}")
-                    if not step_failed: final_task = current; break # Success
+                    await out.send_text(f"Tool Output (Try {attempt+1}):\n```\n{_clip(step_res_str)}\n```"); log.info("Step %d, Try %d Exit=%s, Failed=%s", idx+1, attempt+1, exit_code, step_failed)
+                    if not step_failed: break # Success
                     # Error, try correction
-                    await websocket.send_text(f"Agent: Step {idx + 1} error (Try {attempt + 1}).")
-                    correction = await review_and_resolve(current, step_res_str, attempt, planner_model_name, websocket)
+                    await out.send_text(f"Agent: Step {idx + 1} error (Try {attempt + 1}).")
+                    correction = await review_and_resolve(current, parsed, attempt, planner_model_name, out, correction_budget)
                     if correction:
-                        await websocket.send_text(f"Agent: Applying correction (Try {attempt + 2})...")
-                        if correction.get('description') != tasks[idx]['description']: tasks[idx]['description'] = correction['description']; await send_task_update(websocket, tasks)
-                        current = correction; final_task = current
+                        await out.send_text(f"Agent: Applying correction (Try {attempt + 2})...")
+                        renamed = correction.description != state.description
+                        current = state.executed = replace(correction, depends_on=state.task.depends_on); tool, params = current.tool, current.params
+                        if renamed: coalescer.mark_dirty(tasks)
                     else: break # No correction / Max retries
-                except Exception as tool_err: step_res_str=f"Error: Tool exception: {tool_err}\n{traceback.format_exc()}"; await websocket.send_text(f"Error: Tool '{tool}' failed: {tool_err}"); break
-            # After Retry Loop
-            count += 1
-            final_parsed = parse_tool_output(step_res_str); final_exit = final_parsed.get('exit_code')
-            final_failed = False
-            if final_exit is not None and final_exit != 0: final_failed = True
-            elif any(e in step_res_str.lower() for e in ["error:", "fail", "except", "timeout"]): final_failed = True
-            # Optional: Add final check: if not final_failed and tool in [...] : final_failed = not check_output_vs_expected(...)
-            final_status = 'error' if final_failed else 'done'
-            tasks[idx].update({'status': final_status, 'final_executed_task': final_task, 'result': step_res_str})
-            await send_task_update(websocket, tasks); await websocket.send_text(f"**Agent: Step {idx+1} finished: {final_status.upper()}**")
-            if final_status == 'error': failed = True; stopped = True; msg = f"Agent Error: Failed step {idx+1}."; await websocket.send_text(f"**{msg}**"); break # Stop workflow
-            last_successful_output = final_parsed.get('output') or final_parsed.get('raw')
-            await asyncio.sleep(0.2)
+                except Exception as tool_err: log.debug("Step %d: tool %r raised", idx+1, tool, exc_info=True); step_res_str = "Error: Tool exception: " + "".join(traceback.format_exception_only(type(tool_err), tool_err)).strip(); step_failed = True; await out.send_text(f"Error: Tool '{tool}' failed: {tool_err}"); break
+            # After Retry Loop: the last attempt's verdict stands, no second classification pass
+            final_status = 'error' if step_failed else 'done'
+            state.status, state.result = final_status, step_res_str
+            coalescer.mark_dirty(tasks); await out.send_text(f"**Agent: Step {idx+1} finished: {final_status.upper()}**"); await out.flush() # Step boundary
+            if final_status == 'error': return True # No further steps start once one has failed
+            outputs[idx] = parsed.get('output') or parsed.get('raw'); return False
+
+        async def run_step(idx: int, deps: list):
+            """Wait for the dependencies, then run the step. Returns True if it failed, None if it never ran."""
+            nonlocal failed_step
+            if deps and not all(r is False for r in await asyncio.gather(*(steps[d] for d in deps))): return None # A dependency failed or was skipped
+            if failed_step is not None: return None # Workflow is stopping
+            if await execute_step(idx, outputs[deps[-1]] if deps else "No output from previous steps."):
+                failed_step = idx if failed_step is None else min(failed_step, idx); return True
+            return False
+
+        async def settle_steps():
+            """Wait until every dispatched step has finished or been skipped."""
+            if steps: await asyncio.gather(*steps.values())
+
+        async def dispatch(raw_task: Task) -> bool:
+            """Register a validated plan step and schedule it. Returns False once no further steps should start."""
+            nonlocal stopped
+            if failed_step is not None: return False # A running step already failed
+            idx = len(tasks)
+            if idx >= MAX_WORKFLOW_STEPS: # Check Limit
+                await out.send_text(f"**Warn: Max steps ({MAX_WORKFLOW_STEPS}) reached.**")
+                stopped = True; return False
+            tasks.append(TaskStatus(raw_task)); coalescer.mark_dirty(tasks)
+            deps = _step_dependencies(raw_task, idx)
+            waiting = [str(d+1) for d in deps if not steps[d].done()]
+            if waiting: await out.send_text(f"Agent: Step {idx+1} waits for step(s) {', '.join(waiting)}.")
+            steps[idx] = asyncio.create_task(run_step(idx, deps))
+            return True
+
+        async def resume_plan(raw_llm_response: str, problem: str):
+            """The streamed plan broke off: re-parse the whole response leniently and dispatch the steps not started yet,
+            if the ones already started match its first steps. Otherwise let those finish and return the error to report."""
+            started = len(tasks)
+            await out.send_text(f"Agent: {problem}; re-parsing the full plan.")
+            try: plan = parse_plan(extract_plan_json(raw_llm_response))
+            except ValueError:
+                if not started: raise # Nothing ran: a plain bad plan
+                plan = None
+            if plan is not None and [t.to_dict() for t in plan[:started]] == [t.task.to_dict() for t in tasks]:
+                for raw_task in plan[started:]:
+                    if not await dispatch(raw_task): break
+                return None
+            await settle_steps() # Already running; give them a definite status before reporting
+            ran = "Step 1 had already started from the streamed plan and was" if started == 1 else f"Steps 1-{started} had already started from the streamed plan and were"
+            return f"Agent Error: {problem}. {ran} left to finish (statuses above); no further steps were run."
+
+        await out.send_text("Agent: Planning steps..."); await out.flush()
+        log.info("Using Planner: %s", planner_model_name)
+        query_emb = cached_plan = None
+        if plan_cache.ENABLED: # Near-duplicate of an earlier successful query? Reuse its plan, skip the LLM
+            query_emb = await asyncio.to_thread(plan_cache.embed, user_query)
+            if query_emb: cached_plan = plan_cache.search(query_emb, planner_model_name)
+        if cached_plan:
+            await out.send_text("Agent: Reusing cached plan from a similar earlier query.")
+            for i, raw_task in enumerate(cached_plan):
+                if not await dispatch(_validate_task(raw_task, i)): break
+        elif PLAN_STREAMING:
+            # Prompt asks for thinking block THEN json list; tasks are cut out of the stream as they close
+            scanner, chunks, accepting, bad_step = PlanStreamScanner(), [], True, None
+            async with contextlib.aclosing(_stream_in_thread(simple_prompt_stream, model=planner_model_name, prompt=user_query, system=SYSTEM_PROMPT)) as stream:
+                async for chunk in stream: # aclosing: stop the worker thread as soon as we stop reading
+                    chunks.append(chunk)
+                    if bad_step is not None: continue # No more streamed steps; read the rest for resume_plan
+                    for task_json in scanner.feed(chunk):
+                        try: raw_task = _validate_task(_loads_lenient(task_json), len(tasks))
+                        except ValueError as e: bad_step = f"Plan step {len(tasks)+1} is malformed ({e})"; break
+                        accepting = await dispatch(raw_task)
+                        if not accepting: break
+                    if not accepting: break
+            raw_llm_response = "".join(chunks)
+            if not raw_llm_response: raise ValueError("LLM plan response empty.")
+            if bad_step is None and tasks and raw_llm_response.rfind(scanner.TAG) + len(scanner.TAG) != scanner.tag_end:
+                bad_step = "The streamed steps came from before the last </thinking_process> tag" # extract_plan_json would read another list
+            if bad_step is not None:
+                partial = await resume_plan(raw_llm_response, bad_step)
+                if partial: failed = stopped = True; msg = partial; await out.send_text(f"**{msg}**"); return
+            elif not tasks and accepting: # Nothing recognisable streamed (e.g. no thinking tag): parse the whole response
+                for raw_task in parse_plan(extract_plan_json(raw_llm_response)):
+                    if not await dispatch(raw_task): break
+        else:
+            # Prompt asks for thinking block THEN json list
+            raw_llm_response = await asyncio.to_thread(simple_prompt, model=planner_model_name, prompt=user_query, system=SYSTEM_PROMPT) # Off the event loop so other sessions keep running
+            if not raw_llm_response: raise ValueError("LLM plan response empty.")
+            for raw_task in parse_plan(extract_plan_json(raw_llm_response)): # parse_plan raises ValueError on bad plans
+                if not await dispatch(raw_task): break
+        plan_complete = True
+
+        # 2) Plan summary (the task list itself was sent step by step as the plan arrived)
+        if not tasks: await out.send_text("Agent: No steps planned."); return
+        if failed_step is None and not stopped: await out.send_text(f"Agent: Plan: {len(tasks)} steps.") # Planning ran to the end
+        await settle_steps()
+        if failed_step is not None: failed = True; stopped = True; msg = f"Agent Error: Failed step {failed_step+1}."; await out.send_text(f"**{msg}**") # Stop workflow
+        last_successful_output = outputs[max(outputs)] if outputs else "No output from previous steps."
 
         # 4) FINAL VALIDATION / SUMMARIZATION
         if not failed and not stopped:
-            await websocket.send_text("Agent: Performing final check & summarization...")
-            final_check_prompt = (f"Original Query: '{user_query}'\nFinal Result from
\ No newline at end of file
+            await out.send_text("Agent: Performing final check & summarization..."); await out.flush()
+            final_check_prompt = FINAL_ANSWER_PROMPT_PREFIX + f"Original Query: '{user_query}'\nFinal Result from last step:\n```\n{_clip(last_successful_output)}\n```" # Static lead, dynamic tail
+            final_answer = await asyncio.to_thread(simple_prompt, model=planner_model_name, prompt=final_check_prompt)
+            if final_answer: await out.send_text(f"Agent: Final Answer:\n{final_answer}")
+            else: await out.send_text("Agent Warning: Final summarization failed. See step outputs above.")
+            if query_emb and not cached_plan: # Remember the plan as it finally ran (with any corrections applied)
+                await asyncio.to_thread(plan_cache.insert, user_query, query_emb, planner_model_name, [(t.executed or t.task).to_dict() for t in tasks])
+        elif stopped and not failed: msg = "Agent: Workflow stopped early."
+    except Exception as e:
+        failed = True; msg = f"Agent Error: Workflow failed: {e}"
+        log.error("Workflow Error: %s", "".join(traceback.format_exception_only(type(e), e)).strip()); log.debug("Workflow raised", exc_info=True) # Full traceback at DEBUG only
+        await out.send_text(msg) # Sent by the flush in finally
+    finally:
+        for step in steps.values(): step.cancel() # Steps orphaned by a planning/workflow error (no-op once finished)
+        await coalescer.close()
+        if not failed: await out.send_text(f"**{msg}**")
+        try: await out.flush()
+        except Exception as e: log.warning("Error sending workflow finish message: %s", e)
+        out.close()
@@ -208,6 +208,8 @@ document.addEventListener("DOMContentLoaded", () => {
 
 
   // --- WebSocket Connection Logic ---
+  const frameDecoder = new TextDecoder(); // Binary frames <-> text, both UTF-8
+  const frameEncoder = new TextEncoder();
   const connect = () => {
       if (reconnectTimeout) clearTimeout(reconnectTimeout); // Clear any pending retry timer
       if (connectAttempts >= MAX_CONNECT_ATTEMPTS) {
@@ -217,6 +219,7 @@ document.addEventListener("DOMContentLoaded", () => {
       }
       console.log(`Attempting WebSocket connection (Attempt ${connectAttempts + 1})...`);
       ws = new WebSocket(wsURL);
+      ws.binaryType = "arraybuffer"; // Batched messages arrive as binary UTF-8 frames
       connectAttempts++;
       updateVncStatus("Connecting...", true);
 
@@ -228,7 +231,25 @@ document.addEventListener("DOMContentLoaded", () => {
           loadVncFrame();
       };
 
-      ws.onmessage = ({data}) => {
+      ws.onmessage = ({data: frame}) => {
+          const data = typeof frame === "string" ? frame : frameDecoder.decode(frame);
+          // Several messages may arrive in one frame: MESSAGE_BATCH:["msg1","msg2",...]
+          if (data.startsWith("MESSAGE_BATCH:")) {
+               let batch;
+               try {
+                   batch = JSON.parse(data.substring("MESSAGE_BATCH:".length));
+               } catch (e) {
+                   console.error("Failed to parse message batch:", e, "Data:", data);
+                   appendToChat(`Agent Warning: Received malformed message batch: ${data.substring(0,100)}...\n`, 'agent-warning');
+                   return;
+               }
+               batch.forEach(handleMessage);
+          } else {
+               handleMessage(data);
+          }
+      };
+
+      const handleMessage = (data) => {
           // Route messages based on prefix
           if (data.startsWith("TASK_LIST_UPDATE:")) {
                try {
@@ -337,7 +358,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
     appendToChat(queryText, 'user', true); // Display user message, styled as user
 
-    ws.send(JSON.stringify(payload));
+    ws.send(frameEncoder.encode(JSON.stringify(payload))); // Binary frame: the backend parses the bytes directly
     inp.value = ""; // Clear input after sending
     inp.rows = 3; // Reset textarea size
     tasks.innerHTML = '<p class="system-info">Agent processing request...</p>'; // Clear task list
@@ -0,0 +1,31 @@
+"""
+jsonutil.py
+───────────
+JSON helpers shared by the backend: orjson (Rust, parses bytes directly) when installed, stdlib json otherwise.
+
+✓ dumps() returns compact str, dumpb() the same as UTF-8 bytes (for binary frames); loads() accepts str or bytes
+✓ Both backends raise JSONDecodeError (orjson's error subclasses the stdlib one)
+"""
+from __future__ import annotations
+
+import json
+from json import JSONDecodeError
+
+try:
+    import orjson
+    HAS_ORJSON = True
+    dumps = lambda o: orjson.dumps(o).decode()
+    dumpb = orjson.dumps
+    loads = orjson.loads
+    dumps_pretty = lambda o: orjson.dumps(o, option=orjson.OPT_INDENT_2).decode()
+    dumps_sorted = lambda o: orjson.dumps(o, default=str, option=orjson.OPT_SORT_KEYS).decode()
+except ImportError:
+    print("Warning: 'orjson' not found. Using stdlib json.")
+    HAS_ORJSON = False
+    dumps = lambda o: json.dumps(o, ensure_ascii=False, separators=(',', ':'))
+    dumpb = lambda o: dumps(o).encode()
+    loads = json.loads
+    dumps_pretty = lambda o: json.dumps(o, ensure_ascii=False, indent=2)
+    dumps_sorted = lambda o: json.dumps(o, ensure_ascii=False, sort_keys=True, default=str)
+
+__all__ = ["HAS_ORJSON", "JSONDecodeError", "dumps", "dumpb", "loads", "dumps_pretty", "dumps_sorted"]
@@ -9,8 +9,8 @@ Centralised helpers for talking to a local Ollama server.
 """
 from __future__ import annotations
 
-import http.client, json, os, ssl, subprocess, traceback, urllib.parse, shutil
-from typing import Dict, List, Optional
+import functools, http.client, json, logging, os, ssl, subprocess, urllib.parse, shutil
+from typing import Dict, Iterator, List, Optional
 
 # Use the official ollama client library for core operations
 import ollama
@@ -29,7 +29,16 @@ print(f"Using Ollama Endpoint: {OLLAMA_ENDPOINT}")
 # Get default model names from environment or use fallbacks
 PLANNING_TOOLING_MODEL = os.getenv("PLANNING_TOOLING_MODEL", "llama3:latest")
 print(f"Default Planning/Tooling Model: {PLANNING_TOOLING_MODEL}")
-# DEEPCODER_MODEL is set via env var passed to the tool directly if needed
+# BROWSER_AGENT_INTERNAL_MODEL / DEEPCODER_MODEL defaults live in agent.py; sessions pass their own selection down
+
+# How long Ollama keeps a model (and the KV cache of its last prompt) loaded after a call.
+# Kept resident, an identical system-prompt prefix is reused by the server instead of re-prefilled.
+# Accepts Ollama durations ("30m") or seconds; negative = forever.
+_keep_alive_env = os.getenv("OLLAMA_KEEP_ALIVE", "-1").strip()
+OLLAMA_KEEP_ALIVE = int(_keep_alive_env) if _keep_alive_env.lstrip("-").isdigit() else _keep_alive_env
+print(f"Ollama keep_alive: {OLLAMA_KEEP_ALIVE}")
+
+log = logging.getLogger(__name__) # Full tracebacks only at DEBUG level
 
 # Initialize Ollama client (singleton-like)
 try:
@@ -162,6 +171,17 @@ def list_local_models() -> List[str]:
     return [] # Return empty list on complete failure
 
 # ─── Simplified Wrappers for Backend Use ────────────────────────
+@functools.lru_cache(maxsize=8)
+def _system_message(system: str) -> Dict:
+    """Shared (never mutated) system message dict; the same few system prompts are sent on every call."""
+    return {"role": "system", "content": system}
+
+def _build_messages(prompt: str, system: Optional[str] = None) -> List[Dict]:
+    """Chat message list: optional system message, then the user prompt."""
+    messages = [_system_message(system)] if system else []
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
 def simple_prompt(model: str, prompt: str, system: Optional[str] = None) -> Optional[str]:
     """
     Sends a simple user prompt (optionally with a system message) to the specified model.
@@ -174,19 +194,69 @@ def simple_prompt(model: str, prompt: str, system: Optional[str] = None) -> Opti
         # Check if model exists locally, pull if not (optional, client might handle this)
         # _ensure_model_pulled(model) # You could add this helper if needed
 
-        messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
-        messages.append({"role": "user", "content": prompt})
+        messages = _build_messages(prompt, system)
 
         print(f"Sending prompt to '{model}'...")
-        response = _client.chat(model=model, messages=messages)
+        response = _client.chat(model=model, messages=messages, keep_alive=OLLAMA_KEEP_ALIVE)
         content = response.get("message", {}).get("content")
         print(f"Received response from '{model}'. Length: {len(content) if content else 0}")
         return content
     except Exception as e:
         print(f"Error during Ollama chat with model '{model}': {e}")
-        traceback.print_exc()
+        log.debug("Ollama chat with %r raised", model, exc_info=True)
+        return None
+
+def simple_prompt_stream(model: str, prompt: str, system: Optional[str] = None) -> Iterator[str]:
+    """
+    Streaming variant of simple_prompt: yields the response content piece by piece as the model generates it.
+    Yields nothing on failure (the error is logged), mirroring simple_prompt's None.
+    """
+    if not _client:
+        print("Error: Ollama client not initialized. Cannot send prompt.")
+        return
+    try:
+        print(f"Streaming prompt to '{model}'...")
+        length = 0
+        for chunk in _client.chat(model=model, messages=_build_messages(prompt, system), stream=True, keep_alive=OLLAMA_KEEP_ALIVE):
+            piece = chunk.get("message", {}).get("content")
+            if piece:
+                length += len(piece)
+                yield piece
+        print(f"Streamed response from '{model}'. Length: {length}")
+    except Exception as e:
+        print(f"Error during streaming Ollama chat with model '{model}': {e}")
+        log.debug("Streaming Ollama chat with %r raised", model, exc_info=True)
+
+_warmed = set() # (model, hash(system)) pairs already prefilled on the server
+
+def warm_prompt_cache(model: str, system: str) -> bool:
+    """
+    Loads the model and prefills `system` once so later calls sharing that system prompt
+    hit the server's prompt cache. Generates a single token; blocking. Returns True on success.
+    """
+    key = (model, hash(system))
+    if not _client or key in _warmed: return key in _warmed
+    try:
+        _client.chat(model=model, messages=_build_messages(".", system), options={"num_predict": 1}, keep_alive=OLLAMA_KEEP_ALIVE)
+        _warmed.add(key)
+        print(f"Warmed prompt cache of '{model}' (system prompt: {len(system)} chars).")
+        return True
+    except Exception as e:
+        print(f"Warning: Could not warm prompt cache of '{model}': {e}")
+        return False
+
+def embed_text(model: str, text: str) -> Optional[List[float]]:
+    """
+    Returns the embedding vector of `text` from the specified Ollama embedding model, or None on failure.
+    """
+    if not _client:
+        print("Error: Ollama client not initialized. Cannot embed text.")
+        return None
+    try:
+        response = _client.embeddings(model=model, prompt=text)
+        return list(response.get("embedding") or []) or None
+    except Exception as e:
+        print(f"Error during Ollama embedding with model '{model}': {e}")
         return None
 
 # --- Optional: Helper to explicitly pull model ---
@@ -7,47 +7,85 @@ main.py ─ FastAPI application entry-point
 """
 
 from __future__ import annotations
-import asyncio, json, os, sys, traceback
+import asyncio, atexit, logging, os, queue, sys
+from logging.handlers import QueueHandler, QueueListener
+from collections import Counter
 from pathlib import Path
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
 # Import API router and agent workflow handler
 from .api import router as api_router
-from .agent import handle_agent_workflow
+from .agent import handle_agent_workflow, BROWSER_AGENT_INTERNAL_MODEL, DEEPCODER_MODEL
+from .tools.browseruse_integration import start_workers as start_browser_workers
+from .jsonutil import HAS_ORJSON, JSONDecodeError, loads
 # Import defaults only for initial setting
-from .llm_handler import PLANNING_TOOLING_MODEL
+from .llm_handler import PLANNING_TOOLING_MODEL, warm_prompt_cache
+from .prompt_template import SYSTEM_PROMPT
+
+# LOG_LEVEL=DEBUG brings back full tracebacks for tool / LLM / workflow errors (user-facing messages stay one line)
+# Records only get queued on the calling thread (the event loop); a listener thread does the blocking stdout writes.
+_log_queue = queue.SimpleQueue()
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper(), handlers=[QueueHandler(_log_queue)], force=True)
+logging.getLogger("app").setLevel(min(logging.INFO, logging.getLogger().level)) # The app's own progress lines, as before
+_log_listener = QueueListener(_log_queue, logging.StreamHandler(sys.stdout)); _log_listener.start()
+atexit.register(_log_listener.stop) # Drain what is still queued on shutdown
+log = logging.getLogger(__name__)
+
+# uvloop (libuv) event loop for the WebSocket and subprocess I/O; uvicorn's --loop uvloop covers the server loop,
+# the policy also covers anything else that creates a loop in this process
+if sys.platform != "win32":
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError: print("Warning: 'uvloop' not found. Using the default asyncio event loop.")
 
 print(f"Python Executable: {sys.executable}")
 print(f"Default Asyncio Policy: {type(asyncio.get_event_loop_policy()).__name__}")
 
 # --- FastAPI App Initialization ---
-app = FastAPI(title="Local AI Agent Backend")
+app = FastAPI(title="Local AI Agent Backend", default_response_class=ORJSONResponse if HAS_ORJSON else JSONResponse)
 app.include_router(api_router, prefix="/api") # Include API routes (like /api/models)
 
+@app.on_event("startup")
+async def _start_browser_workers():
+    start_browser_workers() # Warm browser runners in the background; the first browser step skips the cold start
+
 # ─────────────────────────── WebSocket Chat Endpoint ───────────────────
+MAX_SESSIONS_PER_CLIENT = int(os.getenv("MAX_SESSIONS_PER_CLIENT", "5")) # Open /ws sessions per client host
+_sessions_per_client: Counter = Counter()
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """Handles WebSocket connections for the agent workflow."""
     await websocket.accept()
     client_host = websocket.client.host
     client_port = websocket.client.port
-    print(f"WebSocket connection accepted from: {client_host}:{client_port}")
+    if _sessions_per_client[client_host] >= MAX_SESSIONS_PER_CLIENT: # Each session can run tools / browsers; don't let one client pile them up
+        log.warning("WebSocket rejected for %s:%s: %d sessions already open", client_host, client_port, MAX_SESSIONS_PER_CLIENT)
+        await websocket.close(code=1013, reason="Too many sessions from this client. Try again later."); return
+    _sessions_per_client[client_host] += 1
+    log.info("WebSocket connection accepted from: %s:%s", client_host, client_port)
 
     # --- Default Model Selections (can be overridden by client messages) ---
     current_planner_model = PLANNING_TOOLING_MODEL
-    current_browser_model = os.getenv("BROWSER_AGENT_INTERNAL_MODEL", "qwen2.5:7b") # Default if not set
-    current_code_model    = os.getenv("DEEPCODER_MODEL", "deepcoder:latest") # Default if not set
+    current_browser_model = BROWSER_AGENT_INTERNAL_MODEL
+    current_code_model    = DEEPCODER_MODEL # Env defaults are read once at import
+    # Prefill the planner's system prompt in the background while the user types the first query
+    warmup = asyncio.create_task(asyncio.to_thread(warm_prompt_cache, current_planner_model, SYSTEM_PROMPT))
 
     try:
         while True:
-            # Wait for a message from the client
-            raw_data = await websocket.receive_text()
+            # Wait for a message from the client: binary frames (UTF-8 JSON, parsed as-is) or text from older clients
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect": raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+            raw_data = message.get("bytes") or message.get("text") or ""
             try:
-                client_data = json.loads(raw_data)
-            except json.JSONDecodeError:
-                print(f"Received invalid JSON via WebSocket: {raw_data[:100]}...")
+                client_data = loads(raw_data)
+            except JSONDecodeError:
+                log.warning("Received invalid JSON via WebSocket: %s...", raw_data[:100])
                 await websocket.send_text("Agent Error: Invalid JSON payload received.")
                 continue # Skip processing this message
 
@@ -58,42 +96,41 @@ async def websocket_endpoint(websocket: WebSocket):
             current_browser_model = client_data.get("browser_model", current_browser_model)
             current_code_model    = client_data.get("code_model", current_code_model)
 
-            print(f"Received Query: '{user_query[:50]}...', Planner: {current_planner_model}, Browser: {current_browser_model}, Code: {current_code_model}")
+            log.info("Received Query: '%s...', Planner: %s, Browser: %s, Code: %s", user_query[:50], current_planner_model, current_browser_model, current_code_model)
 
             if not user_query:
                 await websocket.send_text("Agent Error: Received empty query.")
                 continue
 
-            # --- Set Environment Variables for Subprocesses/Tools ---
-            # Make the chosen models available to tools running in subprocesses
-            os.environ["BROWSER_AGENT_INTERNAL_MODEL"] = current_browser_model
-            os.environ["DEEPCODER_MODEL"] = current_code_model # If code tool needs it via env
-
             # --- Execute Agent Workflow ---
             # *** THE FIX IS HERE: Use 'planner_model_name=' to match agent.py ***
             await handle_agent_workflow(
                 user_query=user_query,
                 planner_model_name=current_planner_model, # <<< CORRECTED ARGUMENT NAME
-                websocket=websocket
+                websocket=websocket,
+                browser_model=current_browser_model, # Per session: passed down, never written to os.environ
+                code_model=current_code_model
             )
             # Workflow completion message is handled within handle_agent_workflow
 
     except WebSocketDisconnect as e:
-        print(f"WebSocket disconnected: {client_host}:{client_port} (Code: {e.code}, Reason: {e.reason})")
+        log.info("WebSocket disconnected: %s:%s (Code: %s, Reason: %s)", client_host, client_port, e.code, e.reason)
     except Exception as e:
         # Catch unexpected errors during WebSocket handling or agent execution
-        tb = traceback.format_exc()
-        print(f"WebSocket Error or Agent Workflow Error: {e}\n{tb}")
+        log.exception("WebSocket or agent workflow error (%s:%s)", client_host, client_port) # Traceback formatted only if a handler emits it
         try:
             # Try to inform the client about the error
             await websocket.send_text(f"Agent Error: An unexpected server error occurred: {e}")
         except Exception as send_err:
-            print(f"Failed to send error message to potentially closed WebSocket: {send_err}")
+            log.warning("Failed to send error message to potentially closed WebSocket: %s", send_err)
     finally:
+        _sessions_per_client[client_host] -= 1
+        if _sessions_per_client[client_host] <= 0: del _sessions_per_client[client_host]
+        if not warmup.done(): warmup.cancel() # Only stops waiting; the warm-up thread finishes on its own
         # Ensure WebSocket is closed gracefully if still open
         try: await websocket.close()
         except Exception: pass
-        print(f"WebSocket connection closed for {client_host}:{client_port}")
+        log.info("WebSocket connection closed for %s:%s", client_host, client_port)
 
 # ──────────────────────── Serve Static Frontend Files ───────────────────
 # Determine paths relative to this main.py file
@@ -103,10 +140,27 @@ FRONTEND_DIR = ROOT / "frontend"  # /app/frontend
 
 print(f"Serving static files from container path: {FRONTEND_DIR}")
 
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that resolves each URL path (realpath + directory containment check) only once.
+    Later hits just stat() the resolved file, so edits to the bind-mounted frontend still show up."""
+    MAX_ENTRIES = 512 # Only paths that existed are remembered; bounded so random 404 probes cannot grow it
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs); self._resolved = {}
+
+    def lookup_path(self, path: str):
+        full_path = self._resolved.get(path)
+        if full_path is not None:
+            try: return full_path, os.stat(full_path)
+            except OSError: self._resolved.pop(path, None) # Moved or deleted: resolve again
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None and len(self._resolved) < self.MAX_ENTRIES: self._resolved[path] = full_path
+        return full_path, stat_result
+
 if FRONTEND_DIR.is_dir() and (FRONTEND_DIR / "index.html").is_file():
     try:
         # Mount the directory at the root URL '/'
-        app.mount("/", StaticFiles(directory=str(FRONTEND_DIR), html=True), name="static")
+        app.mount("/", CachedStaticFiles(directory=str(FRONTEND_DIR), html=True, check_dir=False), name="static") # Checked just above
         print(f"Successfully mounted static files from {FRONTEND_DIR} at '/'.")
     except Exception as e:
          print(f"ERROR mounting static files from {FRONTEND_DIR}: {e}")
@@ -0,0 +1,83 @@
+"""
+plan_cache.py
+─────────────
+Remembers plans of successful workflow runs, keyed by the embedding of the user query.
+
+✓ A near-duplicate query (cosine similarity >= PLAN_CACHE_THRESHOLD) reuses the stored plan
+  and skips the planning LLM call entirely
+✓ Only plans from runs that finished successfully are stored (with their corrected tool calls)
+✓ LRU-bounded, persisted as JSON so the cache survives restarts
+
+Opt-in via PLAN_CACHE_ENABLED=1: two similar-looking queries can still need different plans,
+so this is meant for deployments with recurring tasks.
+"""
+from __future__ import annotations
+
+import copy, math, operator, os, threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from .llm_handler import embed_text
+from .jsonutil import dumps, loads
+
+# ─── env / defaults ──────────────────────────────────────────────
+ENABLED = os.getenv("PLAN_CACHE_ENABLED", "0").strip().lower() in ("1", "true", "yes", "on")
+EMBED_MODEL = os.getenv("PLAN_CACHE_EMBED_MODEL", "nomic-embed-text")
+THRESHOLD = float(os.getenv("PLAN_CACHE_THRESHOLD", "0.92"))
+MAX_ENTRIES = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+CACHE_PATH = os.getenv("PLAN_CACHE_PATH", os.path.join(os.path.dirname(__file__), "..", "plan_cache.json"))
+
+# query -> {"model", "embedding" (unit length), "plan"}; order = recency (oldest first)
+_entries: "OrderedDict[str, dict]" = OrderedDict()
+_lock = threading.Lock() # search/insert run on the event loop, saves in worker threads
+
+def _normalize(vec: List[float]) -> Optional[List[float]]:
+    norm = math.sqrt(sum(map(operator.mul, vec, vec)))
+    return [v / norm for v in vec] if norm else None
+
+def _load():
+    try:
+        with open(CACHE_PATH, "rb") as f: data = loads(f.read())
+        for query, entry in data.items(): _entries[query] = entry
+        print(f"Plan cache: loaded {len(_entries)} entries from {CACHE_PATH}")
+    except FileNotFoundError: pass
+    except Exception as e: print(f"Warning: Plan cache at {CACHE_PATH} unreadable, starting empty: {e}")
+
+def _save():
+    with _lock: snapshot = dumps(_entries)
+    tmp_path = CACHE_PATH + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f: f.write(snapshot)
+        os.replace(tmp_path, CACHE_PATH) # Atomic swap; a crash never leaves a half-written cache
+    except Exception as e: print(f"Warning: Could not persist plan cache: {e}")
+
+# ─── Public API ───────────────────────────────────────────────────
+def embed(query: str) -> Optional[List[float]]:
+    """Unit-length embedding of the query, or None if the embedding model is unavailable. Blocking."""
+    vec = embed_text(EMBED_MODEL, query)
+    return _normalize(vec) if vec else None
+
+def search(query_embedding: List[float], planner_model: str) -> Optional[list]:
+    """Best stored plan for this planner model with similarity >= THRESHOLD (deep copy), else None."""
+    best_query, best_score = None, THRESHOLD
+    with _lock:
+        for query, entry in _entries.items():
+            if entry["model"] != planner_model or len(entry["embedding"]) != len(query_embedding): continue
+            score = sum(map(operator.mul, query_embedding, entry["embedding"])) # Both unit length: dot == cosine
+            if score >= best_score: best_query, best_score = query, score
+        if best_query is None: return None
+        _entries.move_to_end(best_query)
+        print(f"Plan cache: hit (similarity {best_score:.3f}) for query '{best_query[:70]}'")
+        return copy.deepcopy(_entries[best_query]["plan"])
+
+def insert(query: str, query_embedding: List[float], planner_model: str, plan: list):
+    """Store the plan of a successful run and persist the cache. Blocking (disk write)."""
+    with _lock:
+        _entries[query] = {"model": planner_model, "embedding": query_embedding, "plan": copy.deepcopy(plan)}
+        _entries.move_to_end(query)
+        while len(_entries) > MAX_ENTRIES: _entries.popitem(last=False)
+    _save()
+
+if ENABLED:
+    print(f"Plan cache enabled (embedding model '{EMBED_MODEL}', threshold {THRESHOLD}).")
+    _load()
@@ -0,0 +1,53 @@
+"""
+task_types.py
+─────────────
+Typed records for the agent workflow: a planned step (Task) and its execution state (TaskStatus).
+
+✓ slots=True: compact instances and plain attribute access instead of nested dict lookups
+✓ Plan JSON <-> Task via from_dict() / to_dict(); tool arguments (command, code, input, ...) live in `params`
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Plan keys that describe the step rather than parametrize the tool ("s"/"status" are LLM noise)
+_NON_PARAM_KEYS = frozenset({'tool', 'description', 'reasoning', 'expected_output', 'depends_on', 'status', 's'})
+
+@dataclass(slots=True)
+class Task:
+    """One plan step as the planner (or a correction) emitted it."""
+    tool: str
+    description: str = ""
+    reasoning: str = "No reasoning provided."
+    expected_output: str = "No specific expectation defined."
+    params: dict = field(default_factory=dict)
+    depends_on: Optional[list] = None # 1-based numbers of earlier steps to wait for; None = infer from data flow
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Task":
+        """Build from a plan item; keys other than the step metadata become tool params."""
+        return cls(tool=d['tool'], description=d.get('description') or "",
+                   reasoning=d.get('reasoning', "No reasoning provided."),
+                   expected_output=d.get('expected_output', "No specific expectation defined."),
+                   params={k: v for k, v in d.items() if k not in _NON_PARAM_KEYS}, depends_on=d.get('depends_on'))
+
+    def to_dict(self) -> dict:
+        """Flat plan-item form (as the planner writes it), e.g. for the plan cache."""
+        d = {'tool': self.tool, 'description': self.description, 'reasoning': self.reasoning,
+             'expected_output': self.expected_output, **self.params}
+        if self.depends_on is not None: d['depends_on'] = self.depends_on
+        return d
+
+@dataclass(slots=True)
+class TaskStatus:
+    """Execution state of one step in a workflow run."""
+    task: Task                       # As planned
+    status: str = 'pending'          # pending / running / done / error
+    result: Optional[str] = None     # Raw output of the last attempt
+    executed: Optional[Task] = None  # Call actually run last (the planned one or a correction)
+
+    @property
+    def description(self) -> str:
+        """What the UI shows: follows corrections."""
+        return (self.executed or self.task).description
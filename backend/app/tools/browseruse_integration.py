@@ -1,17 +1,29 @@
 """
 browseruse_integration.py
 ─────────────────────────
-Utility that launches `run_browser_task.py` in a separate Python process.
+Utility that runs browser tasks through `run_browser_task.py` in a separate Python process.
+
+✓ Default: a pool of BROWSER_WORKERS long-lived `run_browser_task.py --serve` workers (JSON line per task),
+  pre-spawned at server startup and replaced if one dies or times out
+✓ BROWSER_WORKER=0: the old fresh process per task
+✓ Per-step `event:{json}` lines from the runner are streamed to the UI live; stderr goes to the logs line by line;
+  only the final result line is buffered
+✓ Two-stage deadline: the runner cancels its agent at BROWSER_TASK_TIMEOUT and reports it; the runner process is
+  killed only if it overruns that by HARD_TIMEOUT_GRACE, or goes HEARTBEAT_TIMEOUT without a heartbeat (hung)
+✓ Large results arrive through a shared memory segment (the result line only names it), not the pipe
 """
 
 from __future__ import annotations
 import asyncio
-import json
+import functools
 import os
 import subprocess
 import sys
-import traceback
+import logging
 import shlex
+from multiprocessing import shared_memory
+
+from ..jsonutil import dumpb, loads, JSONDecodeError
 
 # --- Paths ---
 PYTHON_EXECUTABLE = sys.executable
@@ -19,45 +31,239 @@ TOOLS_DIR = os.path.dirname(__file__)
 BACKEND_APP_DIR = os.path.dirname(TOOLS_DIR)
 BACKEND_DIR = os.path.dirname(BACKEND_APP_DIR)
 RUNNER_SCRIPT_PATH = os.path.join(BACKEND_DIR, "run_browser_task.py")
+_RUNNER_EXISTS = os.path.isfile(RUNNER_SCRIPT_PATH) # Fixed at deploy time; checked once instead of a stat() per call
+
+log = logging.getLogger(__name__) # Full tracebacks only at DEBUG level
+log.info("[Browser Tool] Subprocess Runner Path: %s", RUNNER_SCRIPT_PATH)
+os.environ.setdefault("PYTHONIOENCODING", "utf-8") # Children inherit the env as-is (env=None): no per-launch dict copy
+BROWSER_WORKER = os.getenv("BROWSER_WORKER", "1").strip().lower() not in ("0", "false", "no") # Reuse warm runner processes
+BROWSER_WORKERS = max(1, int(os.getenv("BROWSER_WORKERS", "2"))) # Pool size = browser tasks that can run at once (all sessions)
+WORKER_LINE_LIMIT = 16 * 1024 * 1024 # Bytes; a result line (page summary) can exceed asyncio's 64 KiB default
+MAX_CONCURRENT_BROWSERS = int(os.getenv("MAX_CONCURRENT_BROWSERS", "4")) # One-shot mode: browser processes across all sessions
+_BROWSE_SEM = asyncio.Semaphore(MAX_CONCURRENT_BROWSERS)
+WORKER_STOP_GRACE = 5.0 # Seconds a stopped worker gets to close its browser before it is killed
+EVENT_PREFIX = b"event:" # Runner stdout lines carrying a progress event (JSON) rather than the result
+HEARTBEAT_PREFIX = b'event:{"heartbeat"' # Liveness-only events: reset the watchdog, nothing to show
+BROWSER_TASK_TIMEOUT = float(os.getenv("BROWSER_TASK_TIMEOUT", "220")) # Soft deadline, enforced by the runner itself
+HARD_TIMEOUT_GRACE = 20.0 # Seconds past the soft deadline before the runner process is killed
+HEARTBEAT_TIMEOUT = 20.0 # Runner heartbeats every 5 s; this long without any line means its event loop is stuck
+LOG_LINE_CLIP_CHARS = 200 # Step goals are forwarded to the UI clipped to this
+# close_fds=False (and no preexec_fn/cwd) lets CPython launch via posix_spawn instead of fork+exec: no page-table copy
+# of the (large) server process. Python fds are non-inheritable by default (PEP 446); _spawn_kw() checks that no other
+# fd (e.g. one opened by a C extension) would leak into the child before taking that path. Python >= 3.8.
+# Only the default asyncio loop spawns through subprocess.Popen; uvloop (the deployed loop, see main.py) spawns through
+# libuv, so there this is a no-op and the default close_fds=True is kept.
+_SPAWN_KW = {"close_fds": False} if getattr(subprocess, "_USE_POSIX_SPAWN", False) else {}
+_STDIO_FDS = frozenset({0, 1, 2}) # The only fds a runner may inherit (its pipes are dup'ed onto these)
+
+def _loop_spawns_via_popen() -> bool:
+    """False under uvloop, whose subprocess_exec never reaches subprocess.Popen's posix_spawn path."""
+    return not type(asyncio.get_running_loop()).__module__.startswith("uvloop")
 
-print(f"[Browser Tool] Subprocess Runner Path: {RUNNER_SCRIPT_PATH}")
+def _spawn_kw() -> dict:
+    """_SPAWN_KW if nothing outside stdio is inheritable right now, else {} (close_fds=True: the fd-closing fork path)."""
+    if not _SPAWN_KW or not _loop_spawns_via_popen(): return {} # uvloop: nothing to decide, skip the fd scan
+    try: fds = [int(name) for name in os.listdir("/proc/self/fd")]
+    except OSError: return _SPAWN_KW # No procfs: rely on PEP 446
+    for fd in fds:
+        if fd in _STDIO_FDS: continue
+        try: inheritable = os.get_inheritable(fd)
+        except OSError: continue # The fd listdir() used, already closed
+        if inheritable:
+            log.debug("[Browser Tool] fd %d is inheritable; spawning with close_fds=True", fd); return {}
+    return _SPAWN_KW
+
+def _read_shm_result(ref: dict) -> dict:
+    """Result dict from the shared memory segment a runner handed over ({"shm": name, "size": n}); unlinks it."""
+    shm = shared_memory.SharedMemory(name=ref["shm"])
+    try: data = bytes(shm.buf[:ref["size"]])
+    finally: shm.close(); shm.unlink() # We own the segment now; unlink even if the copy failed
+    return loads(data)
 
 # ───────────────────────────────────────────────── Prompt Helper ---
-# Definition already accepts step_limit
+_SYSTEM_HEADER_TMPL = (
+    "You are an autonomous browser agent. Complete the user's task using browser actions. "
+    "Aim for ~%d actions max. If complex, gather core info & return summary.\n"
+    "Respond with the final answer/summary ONLY.\n"
+)
+_CONTEXT_LEAD = "\n**Context from previous workflow steps (use if relevant):**\n"
+_TASK_LEAD = "\n--- USER TASK ---\n"
+CONTEXT_HINT_CLIP_CHARS = 1000 # Previous-step output forwarded to the browser agent is cut to about this
+
+@functools.lru_cache(maxsize=8) # step_limit takes only a handful of values
+def _system_header(step_limit: int) -> str:
+    return _SYSTEM_HEADER_TMPL % step_limit
+
+def _clip_hint(hint: str, limit: int = CONTEXT_HINT_CLIP_CHARS) -> str:
+    """Cut at the last line break (or else space) before `limit`, so no word reaches the LLM half-tokenized."""
+    if len(hint) <= limit: return hint
+    cut = hint.rfind("\n", 0, limit)
+    if cut <= limit // 2: cut = hint.rfind(" ", 0, limit) # A line break that early would drop too much
+    return hint[:cut if cut > 0 else limit]
+
 def _build_prompt(user_instruction: str, context_hint: str | None = None, step_limit: int = 15) -> str:
     """Adds a system header to the user instruction for the sub-agent."""
-    header = (
-        f"You are an autonomous browser agent. Complete the user's task using browser actions. "
-        f"Aim for ~{step_limit} actions max. If complex, gather core info & return summary.\n"
-        f"Respond with the final answer/summary ONLY.\n"
-    )
+    parts = [_system_header(step_limit)]
     if context_hint and context_hint != "No output from previous steps.":
-        context_hint_clean = str(context_hint)[:1000]
-        header += f"\n**Context from previous workflow steps (use if relevant):**\n{context_hint_clean}\n"
-    return header + "\n--- USER TASK ---\n" + user_instruction.strip()
+        parts += (_CONTEXT_LEAD, _clip_hint(context_hint), "\n")
+    parts += (_TASK_LEAD, user_instruction.strip())
+    return "".join(parts) # One allocation instead of a chain of intermediate strings
 
 # ───────────────────────────────────────────────── Subprocess Runner ---
-async def _run_subprocess(cmd: list[str], timeout: float, websocket):
-    """Runs a command in a subprocess using asyncio and logs stderr."""
+async def _log_stderr(stream, prefix: str):
+    """Log the runner's log lines as they arrive (one line in memory at a time)."""
+    async for line in stream:
+        text = line.decode('utf-8', errors='replace').rstrip()
+        if text: log.info("%s %s", prefix, text)
+
+async def _send_event(websocket, raw: bytes):
+    """Show one `event:{json}` progress line from the runner (one per browser-agent step) in the UI."""
+    if websocket is None: return
+    try: event = loads(raw)
+    except JSONDecodeError: return
+    goal, url = str(event.get("goal") or "")[:LOG_LINE_CLIP_CHARS], event.get("url")
+    try: await websocket.send_text(f"Browser Tool: Step {event.get('step', '?')}: {goal or 'working'}" + (f" ({url})" if url else ""))
+    except Exception: pass # UI gone; keep reading so the child never blocks on a full pipe
+
+async def _readline_watched(stream, idle_limit: float | None) -> bytes:
+    """readline() that raises TimeoutError when the runner stays silent longer than idle_limit (None = no limit)."""
+    try:
+        async with asyncio.timeout(idle_limit): return await stream.readline()
+    except TimeoutError:
+        log.warning("[Browser Tool] No heartbeat from the browser runner for %ss; treating it as hung.", idle_limit); raise
+
+async def _read_result(stream, websocket) -> bytes:
+    """Drain a one-shot runner's stdout: forward `event:` lines, keep the last other non-empty line (the JSON result).
+    The heartbeat watchdog arms with the first event (start-up and imports may be slow) and disarms at the result."""
+    last, idle_limit = b"", None
+    while line := await _readline_watched(stream, idle_limit):
+        if line.startswith(EVENT_PREFIX):
+            idle_limit = HEARTBEAT_TIMEOUT
+            if not line.startswith(HEARTBEAT_PREFIX): await _send_event(websocket, line[len(EVENT_PREFIX):])
+        elif line.strip(): last, idle_limit = line, None # Result is in; the runner may take a while to close Chromium
+    return last
+
+async def _run_subprocess(cmd: list[str], timeout: float, websocket, input_bytes: bytes | None = None):
+    """Runs a command in a subprocess using asyncio, feeding `input_bytes` to its stdin.
+    stderr is streamed line by line to the log, `event:` lines on stdout to the UI; only the result line is kept."""
     process = await asyncio.create_subprocess_exec(
         *cmd,
+        stdin=asyncio.subprocess.PIPE if input_bytes is not None else None,
         stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
-        env={**os.environ, "PYTHONIOENCODING": "utf-8"}
+        limit=WORKER_LINE_LIMIT, **_spawn_kw()
     )
+    async def _communicate():
+        if input_bytes is not None:
+            try: process.stdin.write(input_bytes); await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError): pass # Exited early; its exit code tells why
+            process.stdin.close()
+        stdout_line, _ = await asyncio.gather(_read_result(process.stdout, websocket),
+                                              _log_stderr(process.stderr, "[Browser Subprocess]"))
+        await process.wait(); return process.returncode, stdout_line
     try:
-        stdout_bytes, stderr_bytes = await asyncio.wait_for(process.communicate(), timeout=timeout)
-        exit_code = process.returncode
-        if stderr_bytes:
-             stderr_str = stderr_bytes.decode('utf-8', errors='replace').strip()
-             print(f"--- [Browser Subprocess STDERR] ---\n{stderr_str}\n---")
-             # Optional: Send snippets to UI for live debugging
-             # await websocket.send_text(f"Browser Tool Log: {stderr_str[:200]}...")
-        return exit_code, stdout_bytes
-    except asyncio.TimeoutError:
-        print(f"Browser subprocess timeout ({timeout}s). Killing...")
+        async with asyncio.timeout(timeout): return await _communicate()
+    except TimeoutError:
+        log.warning("Browser subprocess timeout or hang (deadline %ss). Killing...", timeout)
         try: process.kill(); await process.wait()
         except Exception: pass
         raise # Re-raise TimeoutError
+    except asyncio.CancelledError: # Step cancelled: don't leave the runner (and its Chromium) orphaned
+        try: process.kill(); await asyncio.shield(process.wait())
+        except Exception: pass
+        raise
+
+# ───────────────────────────────────────────────── Persistent Worker ---
+class _BrowserWorker:
+    """A `run_browser_task.py --serve` process kept alive between browser steps, so each task skips the
+    interpreter start and Browser-Use imports. One task at a time; a dead or timed-out worker is replaced."""
+    def __init__(self):
+        self.proc = self._stderr_task = None; self.lock = asyncio.Lock()
+
+    async def _ensure_started(self):
+        if self.proc is not None and self.proc.returncode is None: return
+        log.info("[Browser Tool] Starting persistent browser worker...")
+        self.proc = await asyncio.create_subprocess_exec(
+            PYTHON_EXECUTABLE, RUNNER_SCRIPT_PATH, "--serve",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            limit=WORKER_LINE_LIMIT, **_spawn_kw()
+        )
+        self._stderr_task = asyncio.create_task( # Held so it is not garbage-collected; outlives any one task
+            _log_stderr(self.proc.stderr, "[Browser Worker]"))
+
+    async def warm(self):
+        """Start the process now if it is not running, without waiting for a task."""
+        async with self.lock: await self._ensure_started()
+
+    async def _stop(self):
+        proc, self.proc = self.proc, None
+        if proc is None or proc.returncode is not None: return
+        try:
+            proc.terminate() # SIGTERM: the worker closes its cached Chromium before exiting
+            try: await asyncio.wait_for(proc.wait(), timeout=WORKER_STOP_GRACE)
+            except asyncio.TimeoutError: proc.kill(); await proc.wait()
+        except ProcessLookupError: pass
+
+    async def _read_result(self, proc, websocket) -> bytes:
+        """Forward the task's `event:` lines until its result line arrives (b"" if the worker died).
+        Raises TimeoutError once the task's events stop for HEARTBEAT_TIMEOUT (armed by the first one)."""
+        idle_limit = None # A worker spawned for this task may still be importing
+        while True:
+            line = await _readline_watched(proc.stdout, idle_limit)
+            if not line.startswith(EVENT_PREFIX): return line
+            idle_limit = HEARTBEAT_TIMEOUT
+            if not line.startswith(HEARTBEAT_PREFIX): await _send_event(websocket, line[len(EVENT_PREFIX):])
+
+    async def run(self, payload: bytes, timeout: float, websocket=None) -> tuple[int, bytes]:
+        """Send one task and wait for its result line, streaming its progress events to `websocket`.
+        Returns (exit_code, stdout) like _run_subprocess."""
+        async with self.lock:
+            await self._ensure_started(); proc = self.proc
+            try:
+                proc.stdin.write(payload + b"\n"); await proc.stdin.drain()
+                async with asyncio.timeout(timeout): line = await self._read_result(proc, websocket)
+            except TimeoutError:
+                log.warning("Browser worker timeout or hang (deadline %ss). Restarting it...", timeout)
+                await self._stop(); raise # Re-raise TimeoutError
+            except asyncio.CancelledError: # Step cancelled: the worker would hand this task's result to the next caller
+                await asyncio.shield(self._stop()); raise
+            except (BrokenPipeError, ConnectionResetError, ValueError): line = b"" # Died or oversized line
+            if not line: # Worker crashed mid-task; the next call starts a fresh one
+                await self._stop(); return (proc.returncode if proc.returncode not in (None, 0) else 1), b""
+            return 0, line
+
+class BrowserWorkerPool:
+    """Fixed set of warm workers. A task borrows an idle one (waiting if all are busy) and hands it back
+    afterwards; a worker that died or was killed is respawned in the background before it is needed again."""
+    def __init__(self, size: int):
+        self.workers = [_BrowserWorker() for _ in range(size)]
+        self._idle, self._tasks = asyncio.Queue(), set() # _tasks: strong refs to background (re)starts
+        for worker in self.workers: self._idle.put_nowait(worker)
+
+    def _warm_in_background(self, worker: _BrowserWorker):
+        task = asyncio.create_task(self._warm(worker)); self._tasks.add(task); task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _warm(worker: _BrowserWorker):
+        try: await worker.warm()
+        except Exception as e: log.warning("[Browser Tool] Could not start browser worker: %s", e) # Retried on next use
+
+    def start(self):
+        """Pre-spawn every worker (call once the event loop runs, e.g. at server startup)."""
+        for worker in self.workers: self._warm_in_background(worker)
+
+    async def run(self, payload: bytes, timeout: float, websocket=None) -> tuple[int, bytes]:
+        """Run one task on an idle worker. Same contract as _BrowserWorker.run."""
+        worker = await self._idle.get()
+        try: return await worker.run(payload, timeout, websocket)
+        finally:
+            if worker.proc is None: self._warm_in_background(worker) # Crashed / timed out: replace it off the hot path
+            self._idle.put_nowait(worker)
+
+_pool = BrowserWorkerPool(BROWSER_WORKERS)
+
+def start_workers():
+    """Spawn the worker pool ahead of the first browser task (no-op with BROWSER_WORKER=0)."""
+    if BROWSER_WORKER and _RUNNER_EXISTS: _pool.start()
 
 # ───────────────────────────────────────────────── Public Coroutine ---
 # *** CORRECTION HERE: Change user_instr to user_instruction ***
@@ -70,75 +276,79 @@ async def browse_website(
     step_limit_suggestion: int = 15 # Keep this parameter
 ) -> str:
     """Launch `run_browser_task.py` subprocess to perform a browser task."""
-    if not os.path.exists(RUNNER_SCRIPT_PATH):
+    if not _RUNNER_EXISTS:
         err = f"Error: Browser helper script not found: {RUNNER_SCRIPT_PATH}"
-        await websocket.send_text(f"Agent Error: {err}"); print(f"[Browser Tool] {err}"); return err
+        await websocket.send_text(f"Agent Error: {err}"); log.error("[Browser Tool] %s", err); return err
     if not browser_model:
         err = "Error: No browser_model specified for browse_website."
-        await websocket.send_text(f"Agent Error: {err}"); print(f"[Browser Tool] {err}"); return err
+        await websocket.send_text(f"Agent Error: {err}"); log.error("[Browser Tool] %s", err); return err
 
     # *** CORRECTION HERE: Use the renamed parameter ***
     instructions_for_subprocess = _build_prompt(user_instruction, context_hint, step_limit_suggestion)
 
-    await websocket.send_text("Browser Tool: Launching isolated browser process...")
+    await websocket.send_text("Browser Tool: Sending task to browser worker..." if BROWSER_WORKER else "Browser Tool: Launching isolated browser process...")
     # *** Use the renamed parameter in the log message too ***
-    print(f"[Browser Tool] Model: {browser_model}, Instruction: {user_instruction[:100]}...")
+    log.info("[Browser Tool] Model: %s, Instruction: %s...", browser_model, user_instruction[:100])
 
     # Prepare JSON payload for the subprocess
-    payload = json.dumps({
+    payload = dumpb({ # UTF-8 bytes, written to the runner's stdin as-is
         "instructions": instructions_for_subprocess,
-        "model": browser_model # Pass the required model name
+        "model": browser_model, # Pass the required model name
+        "timeout": BROWSER_TASK_TIMEOUT # The runner stops its agent here and still answers
         })
-    cmd = [PYTHON_EXECUTABLE, RUNNER_SCRIPT_PATH, payload]
-    cmd_str_log = " ".join(shlex.quote(p) for p in cmd) # Safely quoted command for logging
-    print(f"[Browser Tool] Executing: {cmd_str_log}")
-
-    timeout_seconds = 240.0 # Overall timeout for the subprocess
+    timeout_seconds = BROWSER_TASK_TIMEOUT + HARD_TIMEOUT_GRACE # Hard deadline: the runner failed to stop on its own
 
     try:
-        exit_code, stdout_bytes = await _run_subprocess(cmd, timeout=timeout_seconds, websocket=websocket)
+        if BROWSER_WORKER: exit_code, stdout_bytes = await _pool.run(payload, timeout=timeout_seconds, websocket=websocket)
+        else:
+            cmd = [PYTHON_EXECUTABLE, RUNNER_SCRIPT_PATH] # Payload goes through stdin: no ARG_MAX limit for long context
+            log.info("[Browser Tool] Executing: %s (payload %d bytes on stdin)", shlex.join(cmd), len(payload))
+            async with _BROWSE_SEM: # Bounds processes host-wide; the worker path is already one task at a time
+                exit_code, stdout_bytes = await _run_subprocess(cmd, timeout=timeout_seconds, websocket=websocket, input_bytes=payload)
 
         # Process result based on exit code
         if exit_code != 0:
             result_str = f"Error: Browser subprocess failed (Exit: {exit_code})."
             await websocket.send_text(f"Agent Error: {result_str} See backend logs.")
-            print(f"[Browser Tool] {result_str}")
+            log.error("[Browser Tool] %s", result_str)
             # Try to decode stdout anyway for potential error messages from the script itself
             if stdout_bytes:
-                 stdout_str = stdout_bytes.decode('utf-8', errors='replace').strip()
                  try:
-                     error_data = json.loads(stdout_str)
+                     error_data = loads(stdout_bytes) # Parsed straight from the pipe bytes
                      if "error" in error_data: result_str += f" Subprocess Error: {error_data['error']}"
-                 except json.JSONDecodeError: result_str += f" Raw stdout: {stdout_str[:200]}..."
+                 except JSONDecodeError: result_str += f" Raw stdout: {stdout_bytes.decode('utf-8', errors='replace').strip()[:200]}..."
             return result_str # Return the error string
 
         # Exit code 0, process stdout
-        stdout_str = stdout_bytes.decode('utf-8', errors='replace').strip() if stdout_bytes else ""
-        if not stdout_str:
+        stdout_bytes = stdout_bytes.strip() if stdout_bytes else b""
+        if not stdout_bytes:
              await websocket.send_text("Agent Warning: Browser process finished successfully but produced no output.")
-             print("[Browser Tool] Warning: Subprocess exited 0 with empty stdout.")
+             log.warning("[Browser Tool] Subprocess exited 0 with empty stdout.")
              return "Browser action completed with no specific output."
 
         # Decode stdout JSON
-        try: result_data = json.loads(stdout_str)
-        except json.JSONDecodeError:
+        try:
+            result_data = loads(stdout_bytes) # No decode round-trip with orjson
+            if "shm" in result_data: result_data = _read_shm_result(result_data)
+        except JSONDecodeError:
+            stdout_str = stdout_bytes.decode('utf-8', errors='replace')
             err = "Error: Browser process returned non-JSON output."; await websocket.send_text(f"Agent Error: {err}")
-            print(f"[Browser Tool] Invalid JSON. Raw:\n{stdout_str}\n---"); return f"{err} Raw: {stdout_str[:200]}..."
+            log.error("[Browser Tool] Invalid JSON. Raw:\n%s\n---", stdout_str); return f"{err} Raw: {stdout_str[:200]}..."
 
         # Check for 'error' key in the JSON result
         if "error" in result_data:
             err = f"Error from browser task: {result_data['error']}"; await websocket.send_text(f"Agent Error: {err[:200]}...")
-            print(f"[Browser Tool] {err}"); return err
+            log.error("[Browser Tool] %s", err); return err
 
         # Success case: Extract 'result' key
         final_result = result_data.get("result", "Browser task finished (no 'result' key).")
         await websocket.send_text("Browser Tool: Action completed successfully.")
-        print(f"[Browser Tool] Success. Result: {final_result[:200]}..."); return final_result
+        log.info("[Browser Tool] Success. Result: %s...", final_result[:200]); return final_result
 
-    except asyncio.TimeoutError:
-        err = f"Error: Browser subprocess exceeded hard timeout ({timeout_seconds}s)."
-        await websocket.send_text(f"Agent Error: {err}"); print(f"[Browser Tool] {err}"); return err
+    except TimeoutError:
+        err = f"Error: Browser subprocess stopped responding or exceeded hard timeout ({timeout_seconds}s)."
+        await websocket.send_text(f"Agent Error: {err}"); log.error("[Browser Tool] %s", err); return err
     except Exception as e:
         # Catch unexpected errors during subprocess launch or management
-        tb = traceback.format_exc(); err = f"Error launching/managing browser process: {e}"
-        await websocket.send_text(f"Agent Error: {err}"); print(f"[Browser Tool] {err}\n{tb}"); return err
\ No newline at end of file
+        err = f"Error launching/managing browser process: {e}"; log.debug("Browser process management raised", exc_info=True)
+        await websocket.send_text(f"Agent Error: {err}"); log.error("[Browser Tool] %s", err); return err
\ No newline at end of file
@@ -4,11 +4,16 @@ import tempfile
 import os
 import asyncio
 import traceback
+import logging
 import sys
 import re
 import shlex # For safe command formatting/logging
 
 TIMEOUT_SECONDS = 60 # Increased timeout for potential installs
+_MISSING_MODULE_RE = re.compile(r"No module named ['\"](.+?)['\"]")
+_UNSAFE_PKG_CHARS_RE = re.compile(r"[^a-zA-Z0-9_\-.]")
+log = logging.getLogger(__name__) # Full tracebacks only at DEBUG level
+TEMP_DIR = os.environ.get("TEMP", "/tmp") # Scripts are written here; read once at import
 
 async def execute_python_code(code: str, websocket) -> str:
     """
@@ -27,7 +32,7 @@ async def execute_python_code(code: str, websocket) -> str:
     try:
         # Create temp file in a known directory if possible (e.g., /tmp inside container)
         # This avoids potential permission issues in /app
-        temp_dir = os.environ.get("TEMP", "/tmp") # Use TEMP env var or default to /tmp
+        temp_dir = TEMP_DIR
         os.makedirs(temp_dir, exist_ok=True) # Ensure temp dir exists
 
         with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8', dir=temp_dir) as tmp:
@@ -84,7 +89,7 @@ async def execute_python_code(code: str, websocket) -> str:
         except Exception as exec_err:
              # Catch other unexpected errors during execution
              print(f"[Code Interpreter] Unexpected error during script execution attempt {attempt_num}: {exec_err}")
-             traceback.print_exc()
+             log.debug("Script execution attempt %d raised", attempt_num, exc_info=True)
              # Return error message in stderr field
              return -1, "", f"Error: Unexpected error during script execution: {exec_err}"
 
@@ -96,11 +101,11 @@ async def execute_python_code(code: str, websocket) -> str:
 
         # Auto-install and retry logic for ModuleNotFoundError
         if exit_code != 0 and stderr and "ModuleNotFoundError: No module named" in stderr:
-            missing_match = re.search(r"No module named ['\"](.+?)['\"]", stderr)
+            missing_match = _MISSING_MODULE_RE.search(stderr)
             if missing_match:
                 package_name = missing_match.group(1)
                 # Sanitize package name slightly (basic check)
-                package_name = re.sub(r"[^a-zA-Z0-9_\-.]", "", package_name)
+                package_name = _UNSAFE_PKG_CHARS_RE.sub("", package_name)
                 if not package_name:
                      await websocket.send_text("Code Interpreter: Could not parse package name for auto-install.")
                 else:
@@ -167,8 +172,8 @@ async def execute_python_code(code: str, websocket) -> str:
         exc_msg = f"Error: Unexpected error in code interpreter wrapper: {e}"
         await websocket.send_text(f"Agent Error: {exc_msg}")
         print(f"[Code Interpreter] {exc_msg}")
-        traceback.print_exc()
-        final_result_str = f"{exc_msg}\n{traceback.format_exc()}"
+        log.debug("Code interpreter wrapper raised", exc_info=True) # Traceback formatted only if DEBUG is on
+        final_result_str = f"{exc_msg}\n{''.join(traceback.format_exception_only(type(e), e))}"
     finally:
         # Cleanup the temporary file
         if script_path and os.path.exists(script_path):
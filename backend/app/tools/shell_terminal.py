@@ -3,7 +3,10 @@ import subprocess
 import shlex
 import asyncio
 import traceback
+import logging
 import os
+import functools
+from typing import List, Tuple, Union
 
 # Whitelist common safe commands + Python/Pip for agent flexibility
 ALLOWED_COMMANDS = {
@@ -16,13 +19,28 @@ ALLOWED_COMMANDS = {
 ARGUMENT_BLACKLIST_PATTERNS = [';', '|', '&', '`', '$', '(', ')', '<', '>', '*', '?', '[', ']', '{', '}', '\\', '..']
 
 TIMEOUT_SECONDS = 30 # Increased timeout
+log = logging.getLogger(__name__) # Full tracebacks only at DEBUG level
 
-async def execute_shell_command(full_command: str, websocket) -> str:
+# Retries usually repeat the exact same command; tokenize / quote each distinct one once
+@functools.lru_cache(maxsize=256)
+def _split_command(command: str) -> Tuple[str, ...]:
+    return tuple(shlex.split(command)) # Raises ValueError on bad quoting (not cached)
+
+@functools.lru_cache(maxsize=256)
+def _join_command(parts: Tuple[str, ...]) -> str:
+    return shlex.join(parts) # Quoted form for logs / messages
+
+async def execute_shell_command(full_command: Union[str, List[str]], websocket) -> str:
     """
     Safely execute whitelisted shell commands using asyncio subprocess.
+    Accepts a command string (parsed with shlex) or an already tokenized argv list.
     Performs basic command parsing and argument sanitization.
     Returns combined stdout/stderr.
     """
+    if isinstance(full_command, (list, tuple)):
+        cmd_parts = tuple(str(part) for part in full_command) # Already tokenized; skip shlex
+        full_command = _join_command(cmd_parts) # For logging/messages only
+    else: cmd_parts = None
     if not full_command.strip():
          await websocket.send_text("Agent Warning: Received empty shell command.")
          return "Error: No shell command provided to execute."
@@ -32,7 +50,7 @@ async def execute_shell_command(full_command: str, websocket) -> str:
 
     # 1) Parse using shlex (handles basic quoting)
     try:
-        cmd_parts = shlex.split(full_command)
+        if cmd_parts is None: cmd_parts = _split_command(full_command)
     except ValueError as e:
         err_msg = f"Error: Command parsing failed: {e}. Check quoting and special characters."
         await websocket.send_text(f"Agent Error: {err_msg}")
@@ -80,8 +98,8 @@ async def execute_shell_command(full_command: str, websocket) -> str:
     final_result_str = f"Error: Shell command '{command}' execution failed unexpectedly." # Default error
     try:
         # Use the original command path (could be absolute like /usr/bin/python)
-        cmd_exec_list = [command] + args
-        cmd_str_for_log = " ".join(shlex.quote(part) for part in cmd_exec_list) # Safe logging string
+        cmd_exec_list = cmd_parts
+        cmd_str_for_log = _join_command(cmd_exec_list) # Safe logging string
 
         await websocket.send_text(f"Shell Terminal: Running: {cmd_str_for_log}")
         print(f"[Shell Tool] Executing: {cmd_exec_list}")
@@ -151,7 +169,7 @@ async def execute_shell_command(full_command: str, websocket) -> str:
         exc_msg = f"Error: Unexpected error executing shell command '{full_command}': {e}"
         await websocket.send_text(f"Agent Error: {exc_msg}")
         print(f"[Shell Tool] {exc_msg}")
-        traceback.print_exc()
-        final_result_str = f"{exc_msg}\n{traceback.format_exc()}"
+        log.debug("Shell command %r raised", full_command, exc_info=True) # Traceback formatted only if DEBUG is on
+        final_result_str = f"{exc_msg}\n{''.join(traceback.format_exception_only(type(e), e))}"
 
     return final_result_str.strip() # Return combined output string
\ No newline at end of file
@@ -4,9 +4,17 @@ run_browser_task.py
 ───────────────────
 Executes Browser-Use’s Agent in isolation.
 
-Input (argv[1]): JSON {"instructions": "<prompt>", "model": "model:tag"}
-Stdout: JSON {"result": "..."} or {"error": "..."}
+Input (stdin, or argv[1] for manual runs): JSON {"instructions": "<prompt>", "model": "model:tag", "timeout": seconds}
+("timeout" optional: soft deadline for the agent run, default DEFAULT_AGENT_TIMEOUT)
+Stdout: zero or more progress lines `event:{"step": n, "goal": "...", "url": "..."}` (one per agent step) and
+`event:{"heartbeat": ts}` (every HEARTBEAT_INTERVAL s while a task runs), then JSON {"result": "..."} or {"error": "..."}
 Exit code 0 on success, 1 on error.
+A result larger than SHM_RESULT_MIN_BYTES is handed over in a POSIX shared memory segment instead:
+the line is then {"shm": "<segment name>", "size": n} and the reader unlinks the segment.
+
+--serve: persistent worker. Reads one JSON task per stdin line and writes one JSON result per stdout line,
+so the interpreter, Browser-Use imports, the Chromium instance and the Ollama clients stay warm between tasks;
+each task gets a fresh BrowserContext. Exits (closing Chromium) when stdin closes or on SIGTERM.
 """
 
 from __future__ import annotations
@@ -14,24 +22,40 @@ import asyncio
 import json
 import logging
 import os
+import signal
 import sys
+import time
 import traceback
+from multiprocessing import resource_tracker, shared_memory
 from dotenv import load_dotenv
 
 # --- Logging ---
+# Warnings and errors only by default (same LOG_LEVEL as the backend, inherited through the env): a worker serves
+# many tasks, so per-step chatter would cost formatting and stderr writes on every one. LOG_LEVEL=DEBUG brings the trace back.
 logging.basicConfig(
-    level=logging.INFO,
+    level=logging.WARNING,
     format="%(asctime)s [%(levelname)s] [browser-task] %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S"
 )
-logging.getLogger('httpx').setLevel(logging.WARNING)
-logging.getLogger('httpcore').setLevel(logging.WARNING)
+log = logging.getLogger("browser-task")
+log.setLevel(os.getenv("LOG_LEVEL", "WARNING").upper())
+
+# --- JSON (orjson when installed: faster on both the task and the result line) ---
+try:
+    import orjson
+    _dumps = lambda o: orjson.dumps(o).decode(); _loads = orjson.loads # orjson's decode error subclasses json's
+except ImportError:
+    _dumps, _loads = json.dumps, json.loads
+
+SHM_RESULT_MIN_BYTES = 64 * 1024 # Smaller results go straight through the pipe
+DEFAULT_AGENT_TIMEOUT = 220.0 # Seconds; the parent kills the runner only if it overruns this by its grace period
+HEARTBEAT_INTERVAL = 5.0 # Seconds between liveness events while a task runs; the parent treats silence as a hang
 
 # --- Env ---
 BASE_DIR = os.path.dirname(__file__)
 load_dotenv(os.path.join(BASE_DIR, ".env"), override=True)
 OLLAMA_ENDPOINT = os.getenv("OLLAMA_ENDPOINT", "http://host.docker.internal:11434")
-logging.info(f"Ollama Endpoint: {OLLAMA_ENDPOINT}")
+log.debug("Ollama Endpoint: %s", OLLAMA_ENDPOINT)
 
 # --- Imports ---
 try:
@@ -41,18 +65,66 @@ try:
         BrowserContextConfig, BrowserContextWindowSize, BrowserContext
     )
     from langchain_ollama import ChatOllama
-    logging.info("Dependencies loaded successfully.")
+    log.debug("Dependencies loaded successfully.")
 except ImportError as e:
-    logging.error("Import failure: %s", e); print(json.dumps({"error": f"Import Error: {e}"})); sys.exit(1)
+    log.error("Import failure: %s", e); print(_dumps({"error": f"Import Error: {e}"})); sys.exit(1)
 except Exception as e:
-     logging.error("Unexpected import error: %s", e); print(json.dumps({"error": f"Unexpected Import Error: {e}"})); sys.exit(1)
+     log.error("Unexpected import error: %s", e); print(_dumps({"error": f"Unexpected Import Error: {e}"})); sys.exit(1)
+
+# --- Shared Resources (worker mode) ---
+# A worker runs one task at a time, so these need no lock.
+_browser: Browser | None = None        # Chromium is launched once and reused; only contexts are per task
+_llm_cache: dict[str, ChatOllama] = {} # model -> client, keeps its HTTP connection pool
+
+def _get_llm(model: str, num_ctx: int) -> ChatOllama:
+    llm = _llm_cache.get(model)
+    if llm is None:
+        log.debug("Initializing LLM: %s at %s", model, OLLAMA_ENDPOINT)
+        llm = _llm_cache[model] = ChatOllama(model=model, base_url=OLLAMA_ENDPOINT, temperature=0.0, num_ctx=num_ctx)
+        log.debug("LLM initialized.")
+    return llm
+
+def _get_browser() -> Browser:
+    global _browser
+    pw_browser = getattr(_browser, 'playwright_browser', None) # None until the first context launches Chromium
+    if _browser is not None and pw_browser is not None and not pw_browser.is_connected():
+        log.warning("Cached browser disconnected; launching a new one."); _browser = None
+    if _browser is None:
+        log.debug("Initializing Browser...")
+        _browser = Browser(config=BrowserConfig(headless=False, disable_security=True))
+        log.debug("Browser initialized.")
+    return _browser
+
+async def _close_browser():
+    global _browser
+    browser, _browser = _browser, None
+    if browser is None: return
+    try: await browser.close(); log.debug("Browser closed.")
+    except Exception as e: log.warning("Browser close error: %s", e)
+
+# --- Progress Events ---
+_protocol_out = sys.stdout # Where events/results go; serve() points this at the real stdout after diverting prints
+
+def _emit_event(event: dict):
+    try: _protocol_out.write("event:" + _dumps(event) + "\n"); _protocol_out.flush()
+    except Exception as e: log.warning("Could not emit event: %s", e) # Progress is best effort
+
+def _on_step(state, model_output, step: int):
+    """Browser-Use step callback: one `event:` line per step so the UI shows progress while the task runs."""
+    goal = getattr(getattr(model_output, "current_state", None), "next_goal", None)
+    _emit_event({"step": step, "goal": goal, "url": getattr(state, "url", None)})
+
+async def _heartbeat():
+    """Tell the parent the event loop is alive, also during long steps that emit nothing else."""
+    while True: await asyncio.sleep(HEARTBEAT_INTERVAL); _emit_event({"heartbeat": round(time.time(), 1)})
 
 # --- Core Logic ---
-async def _run(instructions: str, model: str) -> dict:
-    llm = None
-    browser: Browser | None = None
+async def _run(instructions: str, model: str, keep_browser: bool = False, timeout: float = DEFAULT_AGENT_TIMEOUT) -> dict:
+    """Run one task. keep_browser=True (worker mode) leaves Chromium running for the next task.
+    `timeout` bounds agent.run(); cleanup runs after it, still inside the parent's grace period."""
     ctx: BrowserContext | None = None
     final_result = None
+    heartbeat = asyncio.create_task(_heartbeat())
 
     # Determine context window size based on model name (VERIFY THESE VALUES)
     default_num_ctx = 8192; num_ctx_to_use = default_num_ctx; model_lower = model.lower()
@@ -60,72 +132,102 @@ async def _run(instructions: str, model: str) -> dict:
     elif 'qwen' in model_lower: num_ctx_to_use = 32768 if any(k in model_lower for k in ['72b','32b','14b','7b']) else 8192
     elif 'mistral' in model_lower or 'mixtral' in model_lower: num_ctx_to_use = 32768
     elif 'phi3' in model_lower: num_ctx_to_use = 128000 if '128k' in model_lower else 4096
-    logging.info(f"Using num_ctx={num_ctx_to_use} for model {model}")
-
-    logging.info(f"Starting task. Model: {model}, Ctx: {num_ctx_to_use}, Instr: {instructions[:100]}...")
+    log.debug("Starting task. Model: %s, Ctx: %d, Instr: %.100s...", model, num_ctx_to_use, instructions)
 
+    failed = True # Any error/timeout: the browser may be wedged, so it is not reused
     try:
-        # 1. Init LLM
-        logging.info(f"Initializing LLM: {model} at {OLLAMA_ENDPOINT}")
-        llm = ChatOllama(model=model, base_url=OLLAMA_ENDPOINT, temperature=0.0, num_ctx=num_ctx_to_use)
-        logging.info("LLM initialized.")
-        # 2. Init Browser
-        logging.info("Initializing Browser...")
-        browser = Browser(config=BrowserConfig(headless=False, disable_security=True))
-        logging.info("Browser initialized.")
+        # 1. Init LLM (cached per model)
+        llm = _get_llm(model, num_ctx_to_use)
+        # 2. Init Browser (cached)
+        browser = _get_browser()
         # 3. Create Context
-        logging.info("Creating Browser Context...")
+        log.debug("Creating Browser Context...")
         ctx = await browser.new_context(config=BrowserContextConfig(browser_window_size=BrowserContextWindowSize(width=1280, height=1024)))
-        logging.info("Browser Context created.")
+        log.debug("Browser Context created.")
         # 4. Init Agent
-        logging.info("Initializing Browser Agent...")
-        agent = BrowserAgent(task=instructions, browser=browser, browser_context=ctx, llm=llm, use_vision=False)
-        logging.info("Browser Agent initialized.")
+        log.debug("Initializing Browser Agent...")
+        agent = BrowserAgent(task=instructions, browser=browser, browser_context=ctx, llm=llm, use_vision=False,
+                             register_new_step_callback=_on_step)
+        log.debug("Browser Agent initialized.")
         # 5. Run Agent Task
-        logging.info("Running agent task...")
-        agent_timeout = 240.0
-        hist = await asyncio.wait_for(agent.run(), timeout=agent_timeout)
+        log.debug("Running agent task...")
+        async with asyncio.timeout(timeout): hist = await agent.run()
         final_result = hist.final_result() if hasattr(hist, "final_result") else str(hist)
+        failed = False
         return {"result": final_result or "Browser task finished (empty result)."}
 
-    except asyncio.TimeoutError:
-        logging.error(f"Task timed out after {agent_timeout}s.")
-        return {"error": f"Browser task timed out after {agent_timeout}s."}
+    except TimeoutError:
+        log.error("Task timed out after %ss.", timeout)
+        return {"error": f"Browser task timed out after {timeout}s."}
     except Exception as e:
-        logging.error(f"Error during task execution: {e}", exc_info=True)
+        log.error("Error during task execution: %s", e); log.debug("Task execution raised", exc_info=True) # Full traceback only at DEBUG level
         return {"error": f"Error during agent execution: {e}"}
 
     finally:
         # 6. Cleanup
-        logging.info("Cleaning up browser resources...")
-        if final_result is not None: logging.info(f"Final Result: {str(final_result)[:200]}...")
-        else: logging.info("Task finished with error or timeout.")
+        if log.isEnabledFor(logging.DEBUG):
+            if final_result is not None: log.debug("Final Result: %.200s...", final_result)
+            else: log.debug("Task finished with error or timeout.")
         if ctx:
             try:
                 is_closed_method = getattr(ctx, 'is_closed', None)
-                if callable(is_closed_method) and not await is_closed_method(): await ctx.close(); logging.info("Context closed.")
-                else: logging.info("Context already closed or cannot check.")
-            except Exception as e: logging.warning(f"Ctx close error: {e}", exc_info=False)
-        if browser:
-            try:
-                is_connected_method = getattr(browser, 'is_connected', None)
-                if callable(is_connected_method) and browser.is_connected(): await browser.close(); logging.info("Browser closed.")
-                else: logging.info("Browser disconnected or cannot check.")
-            except Exception as e: logging.warning(f"Browser close error: {e}", exc_info=False)
-        logging.info("Cleanup finished.")
+                if callable(is_closed_method) and not await is_closed_method(): await ctx.close()
+            except Exception as e: log.warning("Ctx close error: %s", e)
+        if failed or not keep_browser: await _close_browser()
+        heartbeat.cancel() # Only now: closing a wedged browser can take a while, too
 
 # --- CLI Glue ---
-def main():
-    if len(sys.argv) < 2: print(json.dumps({"error": "No JSON input."})); sys.exit(1)
+def _result_line(result_dict: dict) -> str:
+    """The stdout line for a result: the JSON itself, or a reference to a shared memory segment holding it."""
+    payload = _dumps(result_dict)
+    if len(payload) < SHM_RESULT_MIN_BYTES or os.name != "posix": return payload # len() in chars <= bytes: cheap pre-check
+    data = payload.encode()
     try:
-        input_json_str = sys.argv[1]; data = json.loads(input_json_str)
-        instructions = data["instructions"]; model = data["model"]
-        if not model: raise ValueError("'model' missing.")
-        if not instructions: raise ValueError("'instructions' missing.")
-    except (json.JSONDecodeError, KeyError, ValueError) as e:
-        print(json.dumps({"error": f"Input Error: {e}"})); sys.exit(1)
-    except Exception as e: print(json.dumps({"error": f"Arg parsing error: {e}"})); sys.exit(1)
-    result_dict = asyncio.run(_run(instructions, model))
-    print(json.dumps(result_dict)); sys.exit(0 if "result" in result_dict else 1)
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        # Hand ownership to the reader: otherwise this process' resource tracker unlinks the segment on exit
+        resource_tracker.unregister(shm._name, "shared_memory")
+        shm.buf[:len(data)] = data; name = shm.name; shm.close()
+    except Exception as e:
+        log.warning("Shared memory handoff failed, sending the result inline: %s", e); return payload
+    return _dumps({"shm": name, "size": len(data)})
+
+def _parse_task(input_json_str: str | bytes) -> tuple[str, str, float]:
+    """(instructions, model, timeout) from a JSON task. Raises json.JSONDecodeError / KeyError / ValueError."""
+    data = _loads(input_json_str)
+    instructions = data["instructions"]; model = data["model"]
+    if not model: raise ValueError("'model' missing.")
+    if not instructions: raise ValueError("'instructions' missing.")
+    timeout = float(data.get("timeout") or DEFAULT_AGENT_TIMEOUT)
+    return instructions, model, timeout
+
+def serve():
+    """Persistent worker loop: one task per stdin line, one result line per task on stdout."""
+    global _protocol_out
+    out = _protocol_out = sys.stdout; sys.stdout = sys.stderr # Stray library prints must not corrupt the result stream
+    loop = asyncio.new_event_loop(); asyncio.set_event_loop(loop)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0)) # Unwind through finally so Chromium is closed, not orphaned
+    log.debug("Browser worker ready.")
+    try:
+        for line in sys.stdin.buffer: # Bytes straight to the parser, no text decode
+            if not line.strip(): continue
+            try: instructions, model, timeout = _parse_task(line)
+            except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e: result_dict = {"error": f"Input Error: {e}"}
+            else:
+                try: result_dict = loop.run_until_complete(_run(instructions, model, keep_browser=True, timeout=timeout))
+                except Exception as e: result_dict = {"error": f"Worker error: {e}"}
+            out.write(_result_line(result_dict) + "\n"); out.flush()
+    finally:
+        loop.run_until_complete(_close_browser()); loop.close()
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve": serve(); sys.exit(0)
+    input_json = sys.argv[1] if len(sys.argv) > 1 else sys.stdin.buffer.read() # stdin: no ARG_MAX limit, no quoting
+    if not input_json.strip(): print(_dumps({"error": "No JSON input."})); sys.exit(1)
+    try: instructions, model, timeout = _parse_task(input_json)
+    except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
+        print(_dumps({"error": f"Input Error: {e}"})); sys.exit(1)
+    except Exception as e: print(_dumps({"error": f"Arg parsing error: {e}"})); sys.exit(1)
+    result_dict = asyncio.run(_run(instructions, model, timeout=timeout))
+    print(_result_line(result_dict)); sys.exit(0 if "result" in result_dict else 1)
 
 if __name__ == "__main__": main()
\ No newline at end of file
@@ -9,22 +9,55 @@ Usage:
 from __future__ import annotations
 
 import argparse
+import asyncio
+import heapq
 import html
+import json
 import logging
+import multiprocessing
+import random
 import re
+import sqlite3
 import sys
-import threading
-import time
-from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
-import requests
-from bs4 import BeautifulSoup
+import httpx
 from fpdf import FPDF
+from lxml import etree
+from lxml import html as lxml_html
 from tqdm import tqdm
 
+try:
+    import h2  # noqa: F401  (httpx's HTTP/2 support needs it)
+except ImportError:
+    HTTP2_AVAILABLE = False
+else:
+    HTTP2_AVAILABLE = True
+
+# API JSON (rendered HTML above all) compresses 5-10x; offer Brotli only when httpx can decode it.
+try:
+    import brotli  # noqa: F401
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+else:
+    ACCEPT_ENCODING = "gzip, deflate, br"
+
+# orjson (Rust) decodes the API's bytes directly and several times faster; stdlib json otherwise.
+try:
+    import orjson
+except ImportError:
+    _json_loads = json.loads
+else:
+    _json_loads = orjson.loads
+
+# With zstandard installed, cached page texts are stored compressed (typically 3-4x smaller).
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 API_URL = "https://mushokutensei.fandom.com/api.php"
 USER_AGENT = (
@@ -32,7 +65,41 @@ USER_AGENT = (
     "(https://github.com/openai/cursor, contact: support@openai.com)"
 )
 
-_thread_local = threading.local()
+# Page texts of earlier runs, reused while a page's revision is unchanged (see PageCache).
+CACHE_DIR_NAME = ".cache"
+CACHE_DB_NAME = "pages.sqlite"
+
+# TextExtracts serves at most 20 whole-page extracts per request.
+EXTRACTS_BATCH_SIZE = 20
+
+# Transient API failures are retried with exponential backoff and jitter before a request is given up on.
+MAX_ATTEMPTS = 5
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_BACKOFF = 10.0
+
+# Non-content elements, stripped before text extraction: these tags, and anything carrying one of the classes.
+_STRIP_TAGS = frozenset({"script", "style"})
+_STRIP_CLASSES = frozenset(
+    {
+        "mw-editsection",
+        "mw-editsection-like",
+        "portable-infobox",
+        "toc",
+        "reference",
+        "references",
+        "infobox",
+        "navbox",
+        "gallery",
+        "wds-tab__content-nav",
+        "wds-is-current",
+    }
+)
+
+# Compiled once here instead of being looked up in re's cache on every page.
+_RE_BLANK_LINES = re.compile(r"\n{3,}")
+_RE_TRAILING_SPACE = re.compile(r"[ \t]+\n")
+# Characters not allowed in page file names.
+_RE_UNSAFE_FILENAME = re.compile(r"[^0-9A-Za-z._-]+")
 
 
 @dataclass
@@ -41,96 +108,329 @@ class PageContent:
     text: str
 
 
-def _get_thread_session() -> requests.Session:
-    session = getattr(_thread_local, "session", None)
-    if session is None:
-        session = requests.Session()
-        session.headers.update({"User-Agent": USER_AGENT})
-        _thread_local.session = session
-    return session
+@dataclass
+class PageInfo:
+    pageid: int
+    revid: int
+    title: str
+
+
+class PageCache:
+    """sqlite store of page texts keyed by page id, valid while the page's latest revision id is unchanged.
+
+    Texts are zstd-compressed BLOBs when zstandard is installed, plain TEXT otherwise; a compressed
+    entry read without zstandard counts as a miss.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages (pageid INTEGER PRIMARY KEY, revid INTEGER NOT NULL, text BLOB NOT NULL)"
+        )
+        self._compressor = zstandard.ZstdCompressor() if zstandard else None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    def lookup(self, pages: List[PageInfo]) -> Dict[int, str]:
+        """Cached texts of the pages whose revision still matches, keyed by page id."""
+        revids = {page.pageid: page.revid for page in pages}
+        rows = self._db.execute(
+            f"SELECT pageid, revid, text FROM pages WHERE pageid IN ({','.join('?' * len(revids))})",
+            list(revids),
+        )
+        texts: Dict[int, str] = {}
+        for pageid, revid, text in rows:
+            if revids[pageid] != revid:
+                continue
+            if isinstance(text, bytes):
+                if self._decompressor is None:
+                    continue
+                text = self._decompressor.decompress(text).decode("utf-8")
+            texts[pageid] = text
+        return texts
+
+    def store(self, entries: Iterable[Tuple[PageInfo, str]]) -> None:
+        pack = (lambda text: self._compressor.compress(text.encode("utf-8"))) if self._compressor else str
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO pages (pageid, revid, text) VALUES (?, ?, ?)",
+                [(page.pageid, page.revid, pack(text)) for page, text in entries],
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def create_client(workers: int) -> httpx.AsyncClient:
+    """One client shared by all concurrent downloads.
+
+    Over HTTP/2 the workers' requests are multiplexed on a single connection; without the optional
+    `h2` package (or against an HTTP/1.1-only server) it keeps a connection alive per worker instead.
+    """
+    if not HTTP2_AVAILABLE:
+        logging.info("Package 'h2' not installed; downloading over HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_connections=workers, max_keepalive_connections=workers),
+        headers={"User-Agent": USER_AGENT, "Accept": "application/json", "Accept-Encoding": ACCEPT_ENCODING},
+        timeout=60,
+        follow_redirects=True,
+    )
 
 
-def fetch_all_page_titles(session: requests.Session) -> List[str]:
-    titles: List[str] = []
+async def api_get(client: httpx.AsyncClient, params: Dict[str, object]) -> dict:
+    """GET API_URL and decode the JSON body, retrying rate limits, 5xx responses and transport errors."""
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            response = await client.get(API_URL, params=params)
+            response.raise_for_status()
+            return _json_loads(response.content)
+        except httpx.HTTPStatusError as exc:
+            if exc.response.status_code not in RETRY_STATUSES or attempt == MAX_ATTEMPTS:
+                raise
+            retry_after = exc.response.headers.get("Retry-After")
+            error: Exception = exc
+        except httpx.TransportError as exc:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            retry_after, error = None, exc
+
+        backoff = min(0.5 * 2 ** (attempt - 1) + random.random() * 0.1, MAX_BACKOFF)
+        if retry_after and retry_after.isdigit():
+            backoff = max(backoff, min(float(retry_after), MAX_BACKOFF))
+        logging.debug("Retrying API request in %.1fs after attempt %d: %s", backoff, attempt, error)
+        await asyncio.sleep(backoff)
+
+
+async def iter_pages(client: httpx.AsyncClient, limit: Optional[int] = None) -> AsyncIterator[PageInfo]:
+    """Yield pages in listing order as each chunk of the allpages listing arrives, at most `limit`."""
+    count = 0
+    # generator=allpages + prop=info lists every page together with its latest revision id.
     params = {
         "action": "query",
-        "list": "allpages",
-        "apnamespace": 0,
-        "aplimit": 500,
+        "generator": "allpages",
+        "gapnamespace": 0,
+        "gaplimit": 500,
+        "prop": "info",
         "format": "json",
         "formatversion": 2,
     }
 
     logging.info("Fetching page list from %s", API_URL)
     while True:
-        response = session.get(API_URL, params=params, timeout=60)
-        response.raise_for_status()
-        data = response.json()
-        batch = [page["title"] for page in data["query"]["allpages"]]
-        titles.extend(batch)
-        logging.debug("Fetched %d titles (total so far: %d)", len(batch), len(titles))
-
+        data = await api_get(client, params)
+        # Generator results are not guaranteed to be in title order; code point order matches allpages'.
+        batch = sorted(
+            (
+                PageInfo(pageid=page["pageid"], revid=page["lastrevid"], title=page["title"])
+                for page in data.get("query", {}).get("pages", [])
+            ),
+            key=lambda page: page.title,
+        )
+        if limit is not None:
+            batch = batch[: limit - count]
+        for page in batch:
+            yield page
+        count += len(batch)
+        logging.debug("Fetched %d titles (total so far: %d)", len(batch), count)
+
+        # No pause between listing requests: the downloads started from earlier titles pace the API.
         cont = data.get("continue")
-        if not cont:
+        if not cont or (limit is not None and count >= limit):
             break
         params.update(cont)
-        time.sleep(0.2)
 
-    return titles
+
+def _strip_targets(root: lxml_html.HtmlElement) -> List[etree._Element]:
+    # One walk in document order; a class attribute is split once and tested as a token set
+    # (whole-class match, like the CSS ".name" selector).
+    targets = []
+    for element in root.iter():
+        if element.tag in _STRIP_TAGS or element.tag is etree.Comment:
+            targets.append(element)
+            continue
+        classes = element.get("class")
+        if classes and not _STRIP_CLASSES.isdisjoint(classes.split()):
+            targets.append(element)
+    return targets
 
 
 def extract_clean_text(html_fragment: str) -> str:
-    soup = BeautifulSoup(html_fragment, "html.parser")
-
-    for selector in [
-        "script",
-        "style",
-        ".mw-editsection",
-        ".mw-editsection-like",
-        ".portable-infobox",
-        ".toc",
-        ".reference",
-        ".references",
-        ".infobox",
-        ".navbox",
-        ".gallery",
-        ".wds-tab__content-nav",
-        ".wds-is-current",
-    ]:
-        for element in soup.select(selector):
-            element.decompose()
-
-    text = soup.get_text(separator="\n")
-    text = html.unescape(text)
+    root = lxml_html.fromstring(html_fragment)
+
+    # Remove non-content elements: emptied in place, so the text that follows them stays a separate string
+    for element in _strip_targets(root):
+        element.clear(keep_tail=True)
+
+    return normalize_text(html.unescape("\n".join(root.itertext())))
+
+
+def normalize_text(text: str) -> str:
     text = text.replace("\xa0", " ")
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = _RE_BLANK_LINES.sub("\n\n", text)
+    text = _RE_TRAILING_SPACE.sub("\n", text)
     text = text.strip()
     return text
 
 
-def fetch_page_content(title: str, session: Optional[requests.Session] = None) -> PageContent:
+async def fetch_extracts(titles: List[str], client: httpx.AsyncClient) -> Dict[str, str]:
+    """Plain-text extracts (TextExtracts) for a batch of titles, keyed by the requested title.
+
+    Titles the wiki returned no extract for are left out, so callers can fall back to the parse API.
+    """
+    params = {
+        "action": "query",
+        "prop": "extracts",
+        "explaintext": 1,
+        "exsectionformat": "plain",
+        "exlimit": len(titles),
+        "titles": "|".join(titles),
+        "format": "json",
+        "formatversion": 2,
+    }
+    extracts: Dict[str, str] = {}
+    aliases: Dict[str, str] = {}
+    while True:
+        data = await api_get(client, params)
+
+        query = data.get("query", {})
+        # Map the wiki's canonical titles back to the ones we asked for.
+        for key in ("normalized", "redirects"):
+            for entry in query.get(key, []):
+                aliases[entry["to"]] = aliases.get(entry["from"], entry["from"])
+        for page in query.get("pages", []):
+            if "extract" in page:
+                extracts[aliases.get(page["title"], page["title"])] = normalize_text(page["extract"])
+
+        # Whole-page extracts may be capped per request; "continue" points at the pages still missing.
+        cont = data.get("continue")
+        if not cont or "excontinue" not in cont:
+            break
+        params.update(cont)
+    return extracts
+
+
+async def fetch_page_content(title: str, client: httpx.AsyncClient) -> PageContent:
     params = {
         "action": "parse",
         "page": title,
         "prop": "text",
+        # Leave out markup extract_clean_text() would only strip again: less HTML to transfer and parse.
+        "disableeditsection": 1,
+        "disabletoc": 1,
+        "disablelimitreport": 1,
         "format": "json",
         "formatversion": 2,
     }
-    session = session or _get_thread_session()
-    response = session.get(API_URL, params=params, timeout=60)
-    response.raise_for_status()
-    data = response.json()
+    data = await api_get(client, params)
 
     html_fragment = data.get("parse", {}).get("text", "")
-    clean_text = extract_clean_text(html_fragment) if html_fragment else ""
+    # Parsing is CPU-bound: run it in a worker thread so other downloads keep going meanwhile.
+    clean_text = await asyncio.to_thread(extract_clean_text, html_fragment) if html_fragment else ""
     return PageContent(title=title, text=clean_text)
 
 
+async def fetch_pages_batch(titles: List[str], client: httpx.AsyncClient) -> List[Optional[PageContent]]:
+    """Download a batch of pages; the result lines up with `titles`, None marking a failed page.
+
+    One extracts request covers the whole batch; pages it has no text for (or a wiki without
+    TextExtracts) go through the rendered HTML instead.
+    """
+    try:
+        extracts = await fetch_extracts(titles, client)
+    except (httpx.HTTPError, ValueError) as exc:
+        logging.warning("Extracts request failed for '%s'..., using parse API: %s", titles[0], exc)
+        extracts = {}
+
+    pages: List[Optional[PageContent]] = []
+    for title in titles:
+        if title in extracts:
+            pages.append(PageContent(title=title, text=extracts[title]))
+            continue
+        try:
+            pages.append(await fetch_page_content(title, client))
+        except Exception as exc:  # pylint: disable=broad-except
+            logging.error("Failed to fetch '%s': %s", title, exc)
+            pages.append(None)
+    return pages
+
+
 def _latin1(text: str) -> str:
+    # The core PDF fonts only cover Latin-1; plain ASCII (most wiki text, and an O(1) check)
+    # needs no encode/decode round trip.
+    if text.isascii():
+        return text
     return text.encode("latin-1", "replace").decode("latin-1")
 
 
+def _add_pdf_page(pdf: FPDF, title: str, text: str) -> None:
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 16)
+    pdf.multi_cell(0, 10, _latin1(title))
+    pdf.ln(4)
+
+    pdf.set_font("Helvetica", size=11)
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            pdf.ln(5)
+            continue
+        pdf.multi_cell(0, 6, _latin1(paragraph))
+        pdf.ln(1)
+
+
+def _render_pdf(pages: multiprocessing.Queue, pdf_path: str) -> None:
+    """PDF process body: lay out (title, text) pairs until None, then write the file if any arrived."""
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    page_count = 0
+    for title, text in iter(pages.get, None):
+        _add_pdf_page(pdf, title, text)
+        page_count += 1
+    if page_count:
+        pdf.output(pdf_path)
+
+
+class PdfWriterProcess:
+    """Builds the PDF in a child process, so fpdf's layout work runs in parallel with the downloads.
+
+    Pages are queued in order with add_page(); the file is written when the block exits cleanly.
+    """
+
+    def __init__(self, pdf_path: Path) -> None:
+        # A forkserver child starts from a clean interpreter instead of inheriting this one's memory.
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        context = multiprocessing.get_context(method)
+        self._pages = context.Queue()
+        self._process = context.Process(
+            target=_render_pdf, args=(self._pages, str(pdf_path)), name="pdf-writer", daemon=True
+        )
+
+    def __enter__(self) -> "PdfWriterProcess":
+        self._process.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self._pages.put(None)
+        else:
+            self._process.terminate()
+        self._process.join()
+        if self._process.exitcode != 0:
+            # Nobody reads the queue any more: don't wait at exit for its buffer to drain into the pipe.
+            self._pages.cancel_join_thread()
+
+    def add_page(self, page: PageContent) -> None:
+        self._pages.put((page.title, page.text))
+
+    @property
+    def exitcode(self) -> Optional[int]:
+        return self._process.exitcode
+
+
 def parse_args(argv: List[str]) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
@@ -143,7 +443,7 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
         "--delay",
         type=float,
         default=0.2,
-        help="Delay (in seconds) between page downloads to avoid hitting rate limits.",
+        help="Delay (in seconds) after each batch download, per worker, to avoid hitting rate limits.",
     )
     parser.add_argument(
         "--max-pages",
@@ -155,7 +455,18 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
         "--workers",
         type=int,
         default=4,
-        help="Number of concurrent download workers (1 for sequential).",
+        help="Number of batches downloaded concurrently (1 for sequential).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="Directory of the page cache; unchanged pages are not downloaded again (default: OUTPUT_DIR/.cache).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Download every page, without reading or updating the page cache.",
     )
     parser.add_argument(
         "--log-level",
@@ -163,7 +474,12 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
         choices=["DEBUG", "INFO", "WARNING", "ERROR"],
         help="Logging verbosity.",
     )
-    return parser.parse_args(argv)
+    args = parser.parse_args(argv)
+    if args.no_cache:
+        args.cache_dir = None
+    elif args.cache_dir is None:
+        args.cache_dir = args.output_dir / CACHE_DIR_NAME
+    return args
 
 
 def main(argv: List[str]) -> int:
@@ -173,6 +489,20 @@ def main(argv: List[str]) -> int:
         format="%(asctime)s %(levelname)s %(message)s",
     )
 
+    return asyncio.run(main_async(args))
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    cache = PageCache(args.cache_dir / CACHE_DB_NAME) if args.cache_dir else None
+    try:
+        async with create_client(max(args.workers, 1)) as client:
+            return await download_wiki(args, client, cache)
+    finally:
+        if cache:
+            cache.close()
+
+
+async def download_wiki(args: argparse.Namespace, client: httpx.AsyncClient, cache: Optional[PageCache]) -> int:
     output_dir: Path = args.output_dir
     text_dir = output_dir / "pages"
     combined_text_path = output_dir / "mushoku_tensei_wiki.txt"
@@ -181,138 +511,126 @@ def main(argv: List[str]) -> int:
     text_dir.mkdir(parents=True, exist_ok=True)
     combined_text_path.parent.mkdir(parents=True, exist_ok=True)
 
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-
     delay = max(args.delay, 0.0)
     workers = max(args.workers, 1)
 
-    listing_session = requests.Session()
-    listing_session.headers.update({"User-Agent": USER_AGENT})
-    try:
-        titles = fetch_all_page_titles(listing_session)
-    finally:
-        listing_session.close()
-
-    if args.max_pages:
-        titles = titles[: args.max_pages]
-    total_titles = len(titles)
-    logging.info("Found %d pages to download", total_titles)
-
-    if total_titles == 0:
-        logging.warning("No page titles retrieved; nothing to download.")
-        return 0
-
+    total_titles = 0
+    cached_pages = 0
     successful_pages = 0
-    next_index_to_write = 0
-    pending_results: Dict[int, Optional[PageContent]] = {}
-
-    with combined_text_path.open("w", encoding="utf-8") as combined_file:
-        first_combined_entry = True
+    next_batch_to_write = 0
+    # Downloaded batches waiting for the ones before them, as a min-heap on batch index.
+    pending_batches: List[Tuple[int, List[Optional[PageContent]]]] = []
+    # Finished (batch index, pages) in completion order; None once every batch is done.
+    completed: asyncio.Queue[Optional[Tuple[int, List[Optional[PageContent]]]]] = asyncio.Queue()
+
+    # The combined file goes through a 1 MiB buffer: it is written page by page and only read once complete.
+    with combined_text_path.open(
+        "w", encoding="utf-8", buffering=1 << 20
+    ) as combined_file, PdfWriterProcess(pdf_path) as pdf:
+        separator = ""
 
         def write_page(page: PageContent) -> None:
-            nonlocal first_combined_entry, successful_pages
-            safe_title = re.sub(r"[^0-9A-Za-z._-]+", "_", page.title).strip("_")
+            nonlocal separator, successful_pages
+            safe_title = _RE_UNSAFE_FILENAME.sub("_", page.title).strip("_")
             file_path = text_dir / f"{safe_title or 'untitled'}.txt"
             file_path.write_text(page.text, encoding="utf-8")
 
-            if not first_combined_entry:
-                combined_file.write("\n")
-            else:
-                first_combined_entry = False
-            combined_file.write(f"{page.title}\n")
-            combined_file.write(f"{'=' * len(page.title)}\n\n")
-            combined_file.write(f"{page.text}\n")
-            combined_file.flush()
-
-            pdf.add_page()
-            pdf.set_font("Helvetica", "B", 16)
-            pdf.multi_cell(0, 10, _latin1(page.title))
-            pdf.ln(4)
-
-            pdf.set_font("Helvetica", size=11)
-            for paragraph in page.text.split("\n"):
-                paragraph = paragraph.strip()
-                if not paragraph:
-                    pdf.ln(5)
-                    continue
-                pdf.multi_cell(0, 6, _latin1(paragraph))
-                pdf.ln(1)
+            # One write per entry: a blank line between entries, then title, underline and text.
+            combined_file.write(f"{separator}{page.title}\n{'=' * len(page.title)}\n\n{page.text}\n")
+            separator = "\n"
 
+            pdf.add_page(page)
             successful_pages += 1
 
         def process_ready_results() -> None:
-            nonlocal next_index_to_write
-            while next_index_to_write in pending_results:
-                page = pending_results.pop(next_index_to_write)
-                if page and page.text:
-                    write_page(page)
-                next_index_to_write += 1
-
-        progress = tqdm(total=total_titles, desc="Downloading pages", unit="page")
-
-        if workers == 1:
-            session = requests.Session()
-            session.headers.update({"User-Agent": USER_AGENT})
-            try:
-                for idx, title in enumerate(titles):
+            nonlocal next_batch_to_write
+            while pending_batches and pending_batches[0][0] == next_batch_to_write:
+                _, pages = heapq.heappop(pending_batches)
+                for page in pages:
+                    if page and page.text:
+                        write_page(page)
+                next_batch_to_write += 1
+
+        def store_batch(batch_index: int, pages: List[Optional[PageContent]]) -> None:
+            heapq.heappush(pending_batches, (batch_index, pages))
+            process_ready_results()
+            progress.update(len(pages))
+
+        # The total is only known once the listing is complete.
+        progress = tqdm(total=None, desc="Downloading pages", unit="page")
+
+        # The semaphore bounds in-flight batches; the delay keeps each slot polite to the API.
+        semaphore = asyncio.Semaphore(workers)
+
+        async def fetch_batch(batch_index: int, batch: List[PageInfo]) -> None:
+            nonlocal cached_pages
+            cached = cache.lookup(batch) if cache else {}
+            cached_pages += len(cached)
+            # Only pages edited since the last run (or new ones) go to the API.
+            stale = [page for page in batch if page.pageid not in cached]
+            fetched: List[Optional[PageContent]] = []
+            if stale:
+                async with semaphore:
                     try:
-                        page = fetch_page_content(title, session)
+                        fetched = await fetch_pages_batch([page.title for page in stale], client)
                     except Exception as exc:  # pylint: disable=broad-except
-                        logging.error("Failed to fetch '%s': %s", title, exc)
-                        pending_results[idx] = None
-                    else:
-                        pending_results[idx] = page
-                    process_ready_results()
-                    progress.update(1)
+                        logging.error("Failed to fetch %d pages from '%s': %s", len(stale), stale[0].title, exc)
+                        fetched = [None] * len(stale)
                     if delay:
-                        time.sleep(delay)
+                        await asyncio.sleep(delay)
+                if cache:
+                    cache.store((page, content.text) for page, content in zip(stale, fetched) if content is not None)
+
+            downloaded = iter(fetched)
+            pages = [
+                PageContent(title=page.title, text=cached[page.pageid]) if page.pageid in cached else next(downloaded)
+                for page in batch
+            ]
+            completed.put_nowait((batch_index, pages))
+
+        async def schedule_batches() -> None:
+            """Start downloading each batch as soon as the listing has produced its titles."""
+            nonlocal total_titles
+            try:
+                async with asyncio.TaskGroup() as downloads:
+                    batch: List[PageInfo] = []
+                    batch_count = 0
+                    async for page in iter_pages(client, args.max_pages or None):
+                        total_titles += 1
+                        batch.append(page)
+                        if len(batch) == EXTRACTS_BATCH_SIZE:
+                            downloads.create_task(fetch_batch(batch_count, batch))
+                            batch, batch_count = [], batch_count + 1
+                    if batch:
+                        downloads.create_task(fetch_batch(batch_count, batch))
+                    logging.info("Found %d pages to download", total_titles)
+                    progress.total = total_titles
+                    progress.refresh()
             finally:
-                session.close()
-        else:
-            with ThreadPoolExecutor(max_workers=workers) as executor:
-                futures: Dict[object, tuple[int, str]] = {}
-                next_submit = 0
-
-                def submit_task(index: int) -> None:
-                    title = titles[index]
-                    future = executor.submit(fetch_page_content, title)
-                    futures[future] = (index, title)
-
-                initial = min(workers, total_titles)
-                while next_submit < initial:
-                    submit_task(next_submit)
-                    next_submit += 1
-
-                while futures:
-                    done, _ = wait(list(futures.keys()), return_when=FIRST_COMPLETED)
-                    for future in done:
-                        idx, title = futures.pop(future)
-                        try:
-                            page = future.result()
-                        except Exception as exc:  # pylint: disable=broad-except
-                            logging.error("Failed to fetch '%s': %s", title, exc)
-                            pending_results[idx] = None
-                        else:
-                            pending_results[idx] = page
-                        process_ready_results()
-                        progress.update(1)
-                        if next_submit < total_titles:
-                            submit_task(next_submit)
-                            next_submit += 1
-                        if delay:
-                            time.sleep(delay)
+                completed.put_nowait(None)
+
+        async with asyncio.TaskGroup() as group:
+            group.create_task(schedule_batches())
+            while (done := await completed.get()) is not None:
+                # File and PDF writes block: keep them off the event loop so downloads continue meanwhile.
+                await asyncio.to_thread(store_batch, *done)
 
         progress.close()
         process_ready_results()
 
+    if total_titles == 0:
+        logging.warning("No page titles retrieved; nothing to download.")
+        return 0
+
     if successful_pages == 0:
         logging.warning("No page content found; skipping PDF generation.")
         return 0
 
-    pdf.output(str(pdf_path))
+    if pdf.exitcode != 0:
+        logging.error("PDF generation failed (exit code %s)", pdf.exitcode)
+        return 1
 
-    logging.info("Saved %d pages", successful_pages)
+    logging.info("Saved %d pages (%d unchanged since the last run)", successful_pages, cached_pages)
     logging.info("Saved combined text to %s", combined_text_path)
     logging.info("Saved PDF to %s", pdf_path)
     return 0